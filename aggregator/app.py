@@ -1,10 +1,25 @@
+import time
+_module_start = time.time()
+
 import requests
+import redis
+import json
 import logging
+import math
+import os
+import queue
+import sys
+import tempfile
+import calendar
+import threading
 import concurrent.futures
-from flask import Flask, jsonify, request
+from collections import OrderedDict, deque
+from flask import Flask, Response, jsonify, request, stream_with_context
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
+
+# Módulo compartido con el commoncrawl-worker: en la imagen está junto a app.py, en el repo en shared/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from redis_nodes import DEFAULT_VNODES, RedisNode, ShardedCache, build_cache_nodes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,40 +28,634 @@ app = Flask(__name__)
 
 COMMONCRAWL_SERVICE = "http://commoncrawl:5000/process"
 COLCAP_SERVICE = "http://colcap:5000/colcap"
+COLCAP_SERIES_SERVICE = "http://colcap:5000/series"
+
+# pandas y numpy se importan en el primer cálculo que los necesita (ver load_data_libs)
+pd = None
+np = None
+
+# Calentar pandas y numpy en un hilo de fondo al arrancar (true/false)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"
+
+_import_lock = threading.Lock()
+import_stats = {
+    "data_libs_loaded": False,
+    "data_libs_import_seconds": None,
+    "module_import_seconds": None
+}
+
+def load_data_libs():
+    """Importa pandas y numpy la primera vez que se necesitan"""
+    global pd, np
+    if import_stats["data_libs_loaded"]:
+        return
+    
+    with _import_lock:
+        if import_stats["data_libs_loaded"]:
+            return
+        
+        start_time = time.time()
+        import pandas as _pd
+        import numpy as _np
+        
+        pd, np = _pd, _np
+        import_stats["data_libs_import_seconds"] = round(time.time() - start_time, 3)
+        import_stats["data_libs_loaded"] = True
+        logger.info(f"pandas/numpy loaded in {import_stats['data_libs_import_seconds']}s")
+
+def start_warmup():
+    """Lanza la importación de pandas y numpy en un hilo de fondo si WARMUP_ON_START está activo"""
+    if not WARMUP_ON_START or import_stats["data_libs_loaded"]:
+        return
+    threading.Thread(target=load_data_libs, name="data-libs-warmup", daemon=True).start()
+
+# Configuración de Redis (resultados materializados por mes)
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+# Meses materializados que se refrescan a la vez tras un evento del worker
+MATERIALIZE_REFRESH_WORKERS = int(os.getenv("MATERIALIZE_REFRESH_WORKERS", "2"))
+# Además de los hilos de gunicorn usan Redis los suscriptores pub/sub de SSE y
+# del scheduler (conexiones permanentes), el scheduler y los refrescos de
+# meses materializados
+REDIS_BACKGROUND_CONNECTIONS = 3 + MATERIALIZE_REFRESH_WORKERS
+REDIS_MAX_CONNECTIONS = int(os.getenv(
+    "REDIS_MAX_CONNECTIONS",
+    str(int(os.getenv("GUNICORN_THREADS", "8")) + REDIS_BACKGROUND_CONNECTIONS)
+))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_RECONNECT_BASE = float(os.getenv("REDIS_RECONNECT_BASE", "1"))
+REDIS_RECONNECT_MAX = float(os.getenv("REDIS_RECONNECT_MAX", "30"))
+
+# Nodos para los agregados materializados ("host:puerto" separados por comas),
+# repartidos con hashing consistente igual que la caché del commoncrawl-worker.
+# Locks y eventos pub/sub viven en el nodo principal REDIS_HOST.
+REDIS_NODES = [node.strip() for node in os.getenv("REDIS_NODES", "").split(",") if node.strip()]
+REDIS_VNODES = int(os.getenv("REDIS_VNODES", str(DEFAULT_VNODES)))
+
+def make_redis_node(host, port):
+    """Nodo Redis con la configuración de pool de este servicio"""
+    return RedisNode(
+        host,
+        port,
+        reconnect_base=REDIS_RECONNECT_BASE,
+        reconnect_max=REDIS_RECONNECT_MAX,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+        decode_responses=True
+    )
+
+primary_node = make_redis_node(REDIS_HOST, REDIS_PORT)
+redis_client = primary_node.client
+redis_state = primary_node.state
+materialized_cache = ShardedCache(build_cache_nodes(primary_node, REDIS_NODES, make_redis_node), REDIS_VNODES)
+
+def get_redis():
+    """Devuelve el cliente del nodo principal si está disponible, o None"""
+    return primary_node.get()
+
+def record_redis_error(error):
+    """Registra un error del nodo principal (solo los de conexión lo marcan como no disponible)"""
+    primary_node.record_error(error)
+
+# Cliente resiliente hacia los servicios downstream
+DOWNSTREAM_TIMEOUT = float(os.getenv("DOWNSTREAM_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "1"))
+# Fracción de peticiones que se puede gastar en reintentos y peticiones duplicadas
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "1.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+# Hilos solo para las peticiones duplicadas (las originales van en _request_executor)
+HEDGE_POOL_SIZE = int(os.getenv("HEDGE_POOL_SIZE", "32"))
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", "512"))
+
+class CircuitOpenError(Exception):
+    """La dependencia tiene el circuit breaker abierto"""
+
+class DownstreamClientError(Exception):
+    """
+    La dependencia respondió 4xx: la petición es inválida, la dependencia está
+    sana. No cuenta para el circuit breaker ni se reintenta.
+    """
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitBreaker:
+    """
+    Circuit breaker por dependencia (closed -> open -> half_open).
+    Tras varios fallos seguidos deja de llamar a la dependencia durante
+    reset_timeout segundos y luego deja pasar una sola petición de prueba.
+    """
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow_request(self):
+        with self._lock:
+            if self.state == "open":
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.time()
+                self._trial_in_flight = False
+    
+    def snapshot(self):
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos tipo token bucket: cada petición deposita
+    `ratio` tokens y cada reintento o petición duplicada gasta uno.
+    Evita que los reintentos multipliquen la carga cuando la dependencia falla.
+    """
+    def __init__(self, ratio, min_tokens=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = float(min_tokens)
+        self._lock = threading.Lock()
+    
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+    
+    def try_spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+class LatencyTracker:
+    """Ventana de latencias recientes para calcular el retardo de las peticiones duplicadas"""
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+    
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+    
+    def quantile(self, q):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    
+    def hedge_delay(self):
+        delay = self.quantile(HEDGE_QUANTILE)
+        if delay is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, delay)
+
+# Pool propio de las peticiones duplicadas: no esperan detrás de las originales que deben adelantar
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=HEDGE_POOL_SIZE,
+    thread_name_prefix="downstream-hedge"
+)
+
+class ResilientClient:
+    """
+    Cliente HTTP para una dependencia con circuit breaker, presupuesto de
+    reintentos y peticiones duplicadas (hedging): si la respuesta tarda más
+    que el p95 observado se lanza una segunda petición, que el Service de
+    Kubernetes enruta por una conexión nueva (normalmente a otra réplica),
+    y se usa la primera que responda.
+    """
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.breaker = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+        self.retry_budget = RetryBudget(RETRY_BUDGET_RATIO)
+        self.latency = LatencyTracker()
+        self.stats = {"requests": 0, "failures": 0, "retries": 0, "hedged": 0, "rejected": 0}
+    
+    def _timed_get(self, params, url, started=None):
+        if started:
+            started.set()
+        start_time = time.time()
+        response = requests.get(url, params=params, timeout=DOWNSTREAM_TIMEOUT)
+        if 400 <= response.status_code < 500:
+            self.latency.record(time.time() - start_time)
+            try:
+                message = response.json().get("message", response.reason)
+            except ValueError:
+                message = response.reason
+            raise DownstreamClientError(response.status_code, message)
+        response.raise_for_status()
+        data = response.json()
+        self.latency.record(time.time() - start_time)
+        return data
+    
+    def _hedged_get(self, params, url):
+        started = threading.Event()
+        futures = [_request_executor.submit(self._timed_get, params, url, started)]
+        if HEDGE_ENABLED:
+            # El retardo cuenta desde que la petición sale, no desde que espera un hilo libre:
+            # una cola local no es una réplica lenta
+            started.wait(DOWNSTREAM_TIMEOUT)
+            done, _ = concurrent.futures.wait(futures, timeout=self.latency.hedge_delay())
+            if not done and self.retry_budget.try_spend():
+                self.stats["hedged"] += 1
+                futures.append(_hedge_executor.submit(self._timed_get, params, url))
+        
+        last_error = None
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                return future.result()
+            except Exception as e:
+                last_error = e
+        raise last_error
+    
+    def get(self, params, url=None):
+        """
+        Hace GET a la dependencia (por defecto a su URL principal, o a otra ruta
+        del mismo servicio); lanza excepción si no se obtuvo respuesta.
+        """
+        url = url or self.url
+        self.stats["requests"] += 1
+        self.retry_budget.record_request()
+        attempts = 0
+        while True:
+            if not self.breaker.allow_request():
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"Circuit breaker open for {self.name}")
+            try:
+                data = self._hedged_get(params, url)
+                self.breaker.record_success()
+                return data
+            except DownstreamClientError:
+                # Error del cliente: la dependencia respondió, no se reintenta
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                if attempts >= MAX_RETRIES or not self.retry_budget.try_spend():
+                    raise
+                attempts += 1
+                self.stats["retries"] += 1
+                logger.warning(f"Retrying {self.name} request {params} after error: {str(e)}")
+    
+    def snapshot(self):
+        p95 = self.latency.quantile(0.95)
+        return {
+            "circuit_breaker": self.breaker.snapshot(),
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2),
+            "latency_p95_seconds": round(p95, 3) if p95 is not None else None,
+            **self.stats
+        }
+
+commoncrawl_client = ResilientClient("commoncrawl", COMMONCRAWL_SERVICE)
+colcap_client = ResilientClient("colcap", COLCAP_SERVICE)
+
+# Última respuesta buena por petición, para responder en modo degradado
+_stale_cache = OrderedDict()
+_stale_cache_lock = threading.Lock()
+
+def remember_response(name, params, data):
+    """Guarda la última respuesta correcta de una dependencia"""
+    key = (name, tuple(sorted(params.items())))
+    with _stale_cache_lock:
+        _stale_cache[key] = data
+        _stale_cache.move_to_end(key)
+        while len(_stale_cache) > STALE_CACHE_SIZE:
+            _stale_cache.popitem(last=False)
+
+def recall_response(name, params):
+    """Retorna (datos, "cache") con la última respuesta guardada, o (None, None)"""
+    key = (name, tuple(sorted(params.items())))
+    with _stale_cache_lock:
+        data = _stale_cache.get(key)
+    if data is None:
+        return None, None
+    return data, "cache"
 
 def fetch_news_data(year, month):
-    """Obtiene datos de noticias de un mes específico"""
+    """
+    Obtiene datos de noticias de un mes específico.
+    Retorna (datos, origen) con origen "live", "cache" o None si no hay datos.
+    """
+    params = {"year": year, "month": month}
     try:
         logger.info(f"Fetching news data for {year}-{month}")
-        response = requests.get(
-            COMMONCRAWL_SERVICE,
-            params={"year": year, "month": month},
-            timeout=30
-        )
-        response.raise_for_status()
-        return response.json()
+        data = commoncrawl_client.get(params)
+        remember_response("commoncrawl", params, data)
+        return data, "live"
     except Exception as e:
         logger.error(f"Error fetching news for {year}-{month}: {str(e)}")
-        return None
+        return recall_response("commoncrawl", params)
 
 def fetch_colcap_data(start_date, end_date):
-    """Obtiene datos del COLCAP para un rango de fechas"""
+    """
+    Obtiene datos del COLCAP para un rango de fechas.
+    Retorna (datos, origen) con origen "live", "cache" o None si no hay datos.
+    """
+    params = {"start_date": start_date, "end_date": end_date}
     try:
         logger.info(f"Fetching COLCAP data from {start_date} to {end_date}")
-        response = requests.get(
-            COLCAP_SERVICE,
-            params={"start_date": start_date, "end_date": end_date},
-            timeout=30
-        )
-        response.raise_for_status()
-        return response.json()
+        data = colcap_client.get(params)
+        remember_response("colcap", params, data)
+        return data, "live"
     except Exception as e:
         logger.error(f"Error fetching COLCAP data: {str(e)}")
-        return None
+        return recall_response("colcap", params)
+
+def fetch_series_data(symbols, start_date, end_date):
+    """
+    Obtiene varias series de colcap-fetcher en formato columnar.
+    Retorna (datos, origen) con origen "live", "cache" o None si no hay datos.
+    Los errores del cliente (p. ej. símbolos desconocidos) se propagan como
+    DownstreamClientError.
+    """
+    params = {"start_date": start_date, "end_date": end_date}
+    if symbols:
+        params["symbols"] = ",".join(symbols)
+    try:
+        logger.info(f"Fetching series {symbols or 'all'} from {start_date} to {end_date}")
+        data = colcap_client.get(params, url=COLCAP_SERIES_SERVICE)
+        remember_response("colcap-series", params, data)
+        return data, "live"
+    except DownstreamClientError:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching series data: {str(e)}")
+        return recall_response("colcap-series", params)
+
+# Control adaptativo de concurrencia del fan-out por meses (AIMD)
+FANOUT_INITIAL_LIMIT = float(os.getenv("FANOUT_INITIAL_LIMIT", "3"))
+FANOUT_MIN_LIMIT = int(os.getenv("FANOUT_MIN_LIMIT", "1"))
+FANOUT_MAX_LIMIT = int(os.getenv("FANOUT_MAX_LIMIT", "32"))
+# Sobrecarga: latencia mayor que FANOUT_LATENCY_TOLERANCE veces la mínima reciente
+FANOUT_LATENCY_TOLERANCE = float(os.getenv("FANOUT_LATENCY_TOLERANCE", "2.0"))
+# Latencia mínima de referencia (evita reaccionar al ruido con respuestas muy rápidas)
+FANOUT_LATENCY_FLOOR = float(os.getenv("FANOUT_LATENCY_FLOOR", "0.05"))
+FANOUT_DECREASE_FACTOR = float(os.getenv("FANOUT_DECREASE_FACTOR", "0.7"))
+# Tiempo mínimo entre dos reducciones del límite
+FANOUT_DECREASE_COOLDOWN = float(os.getenv("FANOUT_DECREASE_COOLDOWN", "1.0"))
+# Hilos para las peticiones originales a las dependencias. Por defecto caben a
+# la vez el fan-out completo, una petición por hilo de gunicorn (COLCAP,
+# /correlation/matrix) y los hilos de fondo (scheduler y refrescos), así
+# ninguna espera en cola
+DOWNSTREAM_POOL_SIZE = int(os.getenv(
+    "DOWNSTREAM_POOL_SIZE",
+    str(FANOUT_MAX_LIMIT + int(os.getenv("GUNICORN_THREADS", "8")) + 1 + MATERIALIZE_REFRESH_WORKERS)
+))
+_request_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=DOWNSTREAM_POOL_SIZE,
+    thread_name_prefix="downstream"
+)
+# Cada proceso gunicorn escribe aquí su estado; /metrics suma el de todos los procesos del pod
+FANOUT_METRICS_DIR = os.getenv(
+    "FANOUT_METRICS_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "aggregator-fanout")
+)
+
+class AdaptiveLimiter:
+    """
+    Limitador de concurrencia AIMD compartido por todas las peticiones del proceso.
+    Cada respuesta rápida y correcta sube el límite en 1/limit (≈ +1 por ronda);
+    un error o una latencia muy por encima de la mínima reciente lo multiplica
+    por FANOUT_DECREASE_FACTOR. Aciertos y fallos de caché del worker tienen
+    latencias muy distintas (ms frente a ~0.1 s de MinHash), así que cada
+    respuesta se compara con la mínima reciente de su clase. Las tareas que superan el límite esperan en cola;
+    queue_depth cuenta todos los meses encolados desde que se envían al executor.
+    """
+    def __init__(self):
+        self.limit = FANOUT_INITIAL_LIMIT
+        self.in_flight = 0
+        self.waiting = 0
+        self.latencies = {True: deque(maxlen=100), False: deque(maxlen=100)}
+        self.last_decrease = 0.0
+        self.stats = {"completed": 0, "errors": 0, "decreases": 0}
+        self._condition = threading.Condition()
+    
+    def enqueue(self):
+        """Registra un mes pendiente al enviarlo al executor (antes de que tenga hilo)"""
+        with self._condition:
+            self.waiting += 1
+            self._publish()
+    
+    def acquire(self):
+        """Espera un hueco para un mes ya registrado con enqueue()"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.waiting -= 1
+            self.in_flight += 1
+            self._publish()
+    
+    def release(self, latency, error, cached=False):
+        with self._condition:
+            self.in_flight -= 1
+            self.stats["completed"] += 1
+            if error:
+                self.stats["errors"] += 1
+            
+            latencies = self.latencies[cached]
+            min_latency = min(latencies) if latencies else latency
+            latencies.append(latency)
+            overloaded = error or latency > FANOUT_LATENCY_TOLERANCE * max(min_latency, FANOUT_LATENCY_FLOOR)
+            
+            if overloaded:
+                if time.time() - self.last_decrease >= FANOUT_DECREASE_COOLDOWN:
+                    self.limit = max(FANOUT_MIN_LIMIT, self.limit * FANOUT_DECREASE_FACTOR)
+                    self.last_decrease = time.time()
+                    self.stats["decreases"] += 1
+            else:
+                self.limit = min(FANOUT_MAX_LIMIT, self.limit + 1 / self.limit)
+            self._publish()
+            self._condition.notify_all()
+    
+    def snapshot(self):
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            **self.stats
+        }
+    
+    def _publish(self):
+        """Escribe el estado de este proceso en FANOUT_METRICS_DIR (llamar con el lock tomado)"""
+        path = os.path.join(FANOUT_METRICS_DIR, f"{os.getpid()}.json")
+        try:
+            os.makedirs(FANOUT_METRICS_DIR, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.debug(f"Could not write fan-out metrics: {str(e)}")
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def fanout_snapshot_all():
+    """
+    Suma el estado del limitador de todos los procesos gunicorn vivos del pod.
+    Los contadores de un proceso reciclado desaparecen (Prometheus lo trata
+    como un reinicio del contador).
+    """
+    totals = {"workers": 1, **fanout_limiter.snapshot()}
+    try:
+        names = os.listdir(FANOUT_METRICS_DIR)
+    except OSError:
+        return totals
+    
+    for name in names:
+        if not name.endswith(".json") or name == f"{os.getpid()}.json":
+            continue
+        pid = int(name[:-5])
+        path = os.path.join(FANOUT_METRICS_DIR, name)
+        try:
+            if not process_alive(pid):
+                os.remove(path)
+                continue
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        totals["workers"] += 1
+        for key, value in snapshot.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+fanout_limiter = AdaptiveLimiter()
+
+def fetch_news_data_limited(year, month):
+    """fetch_news_data bajo el limitador adaptativo del fan-out"""
+    fanout_limiter.acquire()
+    start_time = time.time()
+    result = (None, None)
+    try:
+        result = fetch_news_data(year, month)
+        return result
+    finally:
+        fanout_limiter.release(
+            time.time() - start_time,
+            error=result[1] != "live",
+            cached=bool(result[0] and result[0].get("cached"))
+        )
+
+def fetch_news_months(months, use_parallel):
+    """
+    Obtiene las noticias de varios meses (con o sin paralelización).
+    Retorna (news_data, months_missing, months_from_cache).
+    """
+    news_data = []
+    months_missing = []
+    months_from_cache = []
+    
+    def collect(year, month, result):
+        data, source = result
+        if data is None:
+            months_missing.append(f"{year}-{month}")
+            return
+        news_data.append(data)
+        if source == "cache":
+            months_from_cache.append(f"{year}-{month}")
+    
+    if use_parallel and len(months) > 1:
+        # Procesamiento paralelo; la concurrencia efectiva la fija el limitador adaptativo
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(months), FANOUT_MAX_LIMIT)) as executor:
+            future_to_date = {}
+            for year, month in months:
+                fanout_limiter.enqueue()
+                future_to_date[executor.submit(fetch_news_data_limited, year, month)] = (year, month)
+            
+            for future in concurrent.futures.as_completed(future_to_date):
+                year, month = future_to_date[future]
+                collect(year, month, future.result())
+    else:
+        # Procesamiento secuencial
+        for year, month in months:
+            collect(year, month, fetch_news_data(year, month))
+    
+    return news_data, sorted(months_missing), sorted(months_from_cache)
+
+def merge_news_colcap(news_data, colcap_data):
+    """
+    Expande las métricas mensuales de noticias a cada día del mes y las une
+    con las entradas diarias del COLCAP.
+    Retorna (news_by_date, merged_data).
+    """
+    news_by_date = {}
+    for news in news_data:
+        date = news.get('date')
+        # Expandir a todos los días del mes
+        year, month = date.split('-')
+        days_in_month = calendar.monthrange(int(year), int(month))[1]
+        for day in range(1, days_in_month + 1):
+            full_date = f"{year}-{month}-{day:02d}"
+            news_by_date[full_date] = {
+                'date': full_date,
+                'news_count': news.get('news_count', 0),
+                'analysis': news.get('analysis', {})
+            }
+    
+    # Merge de datos
+    merged_data = []
+    for colcap_entry in colcap_data:
+        date = colcap_entry['date']
+        if date in news_by_date:
+            merged_entry = {
+                **news_by_date[date],
+                'colcap_value': colcap_entry['value'],
+                'colcap_change': colcap_entry['change'],
+                'colcap_volume': colcap_entry['volume']
+            }
+            merged_data.append(merged_entry)
+    
+    return news_by_date, merged_data
 
 def calculate_correlation(news_data, colcap_data):
     """Calcula la correlación entre noticias y COLCAP"""
     try:
+        load_data_libs()
+        
         if not news_data or not colcap_data:
             return None
         
@@ -90,7 +699,7 @@ def calculate_correlation(news_data, colcap_data):
 
 def interpret_correlation(corr):
     """Interpreta el coeficiente de correlación"""
-    if pd.isna(corr):
+    if corr is None or math.isnan(corr):
         return "Insuficientes datos para correlación"
     
     abs_corr = abs(corr)
@@ -107,6 +716,532 @@ def interpret_correlation(corr):
     
     return f"Correlación {direction} {strength}"
 
+def news_features(news_data):
+    """
+    Construye la matriz de features de noticias por mes (meses x features):
+    news_count y el conteo de cada palabra clave vista en algún mes.
+    Retorna (meses "YYYY-MM", nombres de features, matriz numpy).
+    """
+    keywords = sorted({
+        keyword
+        for news in news_data
+        for keyword in news.get('analysis', {}).get('top_keywords', {})
+    })
+    features = ['news_count'] + [f"keyword:{keyword}" for keyword in keywords]
+    
+    months = [news.get('date') for news in news_data]
+    matrix = np.zeros((len(news_data), len(features)))
+    for i, news in enumerate(news_data):
+        top_keywords = news.get('analysis', {}).get('top_keywords', {})
+        matrix[i, 0] = news.get('news_count', 0)
+        for j, keyword in enumerate(keywords, start=1):
+            matrix[i, j] = top_keywords.get(keyword, 0)
+    return months, features, matrix
+
+def standardize(matrix):
+    """Estandariza columnas (media 0, desviación 1); columnas constantes quedan en NaN"""
+    std = matrix.std(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (matrix - matrix.mean(axis=0)) / np.where(std > 0, std, np.nan)
+
+def correlation_matrix(news_data, series_response, start_date_str, end_date_str):
+    """
+    Calcula la matriz de correlación features de noticias x símbolos con una
+    sola multiplicación de matrices sobre arreglos diarios alineados y estandarizados.
+    """
+    load_data_libs()
+    
+    months, features, month_matrix = news_features(news_data)
+    symbols = series_response.get('symbols', [])
+    dates = np.array(series_response.get('dates', []))
+    values = np.column_stack([series_response['series'][symbol] for symbol in symbols]) if symbols else np.empty((len(dates), 0))
+    
+    # Alinear: cada día toma las features de su mes; se descartan días sin datos de noticias
+    month_index = {month: i for i, month in enumerate(months)}
+    day_months = np.array([month_index.get(date[:7], -1) for date in dates], dtype=int)
+    in_range = (dates >= start_date_str) & (dates <= end_date_str) if len(dates) else np.zeros(0, dtype=bool)
+    mask = (day_months >= 0) & in_range
+    
+    x = month_matrix[day_months[mask]]
+    y = values[mask]
+    n = len(x)
+    if n < 2:
+        return features, symbols, None, n
+    
+    # Pearson para todos los pares: (Xz^T · Yz) / n
+    corr = standardize(x).T @ standardize(y) / n
+    return features, symbols, corr, n
+
+def list_months(start_date, end_date):
+    """Lista los meses (año, mes) como strings entre dos fechas, ambos inclusive"""
+    current = start_date.replace(day=1)
+    months = []
+    while current <= end_date:
+        months.append((current.strftime("%Y"), current.strftime("%m")))
+        # Avanzar al próximo mes
+        if current.month == 12:
+            current = current.replace(year=current.year + 1, month=1)
+        else:
+            current = current.replace(month=current.month + 1)
+    return months
+
+# Materialización de agregados mensuales en Redis
+MATERIALIZE_ENABLED = os.getenv("MATERIALIZE_ENABLED", "false").lower() == "true"
+# Primer mes a materializar (YYYY-MM); por defecto 24 meses atrás
+MATERIALIZE_START_MONTH = os.getenv("MATERIALIZE_START_MONTH")
+# Los meses recientes se refrescan periódicamente; los históricos solo una vez
+MATERIALIZE_RECENT_MONTHS = int(os.getenv("MATERIALIZE_RECENT_MONTHS", "2"))
+MATERIALIZE_RECENT_REFRESH = int(os.getenv("MATERIALIZE_RECENT_REFRESH", "300"))
+MATERIALIZE_INTERVAL = int(os.getenv("MATERIALIZE_INTERVAL", "60"))
+
+MATERIALIZED_KEY = "agg:month:{year}:{month}"
+SCHEDULER_LOCK_KEY = "agg:scheduler:lock"
+
+scheduler_state = {
+    "running": False,
+    "last_run": None,
+    "last_run_seconds": None,
+    "months_refreshed": 0
+}
+
+def empty_stats():
+    """Estadísticos suficientes para la correlación de Pearson"""
+    return {"n": 0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "syy": 0.0, "sxy": 0.0}
+
+def add_to_stats(stats, x, y):
+    stats["n"] += 1
+    stats["sx"] += x
+    stats["sy"] += y
+    stats["sxx"] += x * x
+    stats["syy"] += y * y
+    stats["sxy"] += x * y
+
+def merge_stats(total, stats):
+    for key in total:
+        total[key] += stats[key]
+
+def correlation_from_stats(stats):
+    """Calcula el mismo análisis que calculate_correlation a partir de estadísticos suficientes"""
+    n = stats["n"]
+    if n < 2:
+        return None
+    
+    mean_x = stats["sx"] / n
+    mean_y = stats["sy"] / n
+    cov = stats["sxy"] - n * mean_x * mean_y
+    var_x = max(stats["sxx"] - n * mean_x * mean_x, 0.0)
+    var_y = max(stats["syy"] - n * mean_y * mean_y, 0.0)
+    correlation = cov / math.sqrt(var_x * var_y) if var_x > 0 and var_y > 0 else float("nan")
+    
+    return {
+        "correlation_coefficient": round(correlation, 4) if not math.isnan(correlation) else 0,
+        "data_points": n,
+        "avg_news_count": round(mean_x, 2),
+        "avg_colcap": round(mean_y, 2),
+        "colcap_volatility": round(math.sqrt(var_y / (n - 1)), 2),
+        "interpretation": interpret_correlation(correlation)
+    }
+
+def materialize_month(year, month):
+    """
+    Calcula y guarda en Redis el agregado de un mes: métricas de noticias,
+    filas diarias unidas con el COLCAP y estadísticos suficientes.
+    Solo materializa datos frescos (no respuestas servidas desde caché).
+    """
+    key = MATERIALIZED_KEY.format(year=year, month=month)
+    if not materialized_cache.available(key):
+        return False
+    
+    days_in_month = calendar.monthrange(int(year), int(month))[1]
+    news, news_source = fetch_news_data(year, month)
+    colcap_response, colcap_source = fetch_colcap_data(f"{year}-{month}-01", f"{year}-{month}-{days_in_month:02d}")
+    if news_source != "live" or colcap_source != "live" or colcap_response.get('status') != 'success':
+        logger.warning(f"Skipping materialization of {year}-{month}: downstream data unavailable")
+        return False
+    
+    news_count = news.get('news_count', 0)
+    rows = []
+    stats = empty_stats()
+    for colcap_entry in colcap_response.get('data', []):
+        rows.append({
+            'date': colcap_entry['date'],
+            'colcap_value': colcap_entry['value'],
+            'colcap_change': colcap_entry['change'],
+            'colcap_volume': colcap_entry['volume']
+        })
+        add_to_stats(stats, news_count, colcap_entry['value'])
+    
+    entry = {
+        "news": news,
+        "rows": rows,
+        "stats": stats,
+        "refreshed_at": time.time()
+    }
+    return materialized_cache.set(key, json.dumps(entry))
+
+def load_materialized(months):
+    """Lee los agregados de varios meses (un MGET por nodo); None si falta alguno"""
+    if not months:
+        return None
+    values = materialized_cache.mget([MATERIALIZED_KEY.format(year=y, month=m) for y, m in months])
+    if any(value is None for value in values):
+        return None
+    return [json.loads(value) for value in values]
+
+def aggregate_from_materialized(entries, start_date_str, end_date_str):
+    """Construye los datos unidos y la correlación a partir de meses materializados"""
+    merged_data = []
+    stats = empty_stats()
+    for entry in entries:
+        news = entry["news"]
+        rows = entry["rows"]
+        news_count = news.get('news_count', 0)
+        full_month = bool(rows) and rows[0]['date'] >= start_date_str and rows[-1]['date'] <= end_date_str
+        month_stats = entry["stats"] if full_month else empty_stats()
+        
+        for row in rows:
+            if not start_date_str <= row['date'] <= end_date_str:
+                continue
+            merged_data.append({
+                'date': row['date'],
+                'news_count': news_count,
+                'analysis': news.get('analysis', {}),
+                **{k: v for k, v in row.items() if k != 'date'}
+            })
+            if not full_month:
+                add_to_stats(month_stats, news_count, row['colcap_value'])
+        merge_stats(stats, month_stats)
+    
+    return merged_data, correlation_from_stats(stats)
+
+def months_to_materialize(now):
+    """Meses que el scheduler debe mantener, marcando cuáles son recientes"""
+    if MATERIALIZE_START_MONTH:
+        start = datetime.strptime(MATERIALIZE_START_MONTH, "%Y-%m")
+    else:
+        start = (now.replace(day=1) - timedelta(days=730)).replace(day=1)
+    months = list_months(start, now)
+    recent = set(months[-MATERIALIZE_RECENT_MONTHS:]) if MATERIALIZE_RECENT_MONTHS > 0 else set()
+    return [(year, month, (year, month) in recent) for year, month in months]
+
+def refresh_materialized():
+    """
+    Una pasada del scheduler: refresca los meses recientes vencidos y
+    materializa una sola vez los históricos que falten.
+    Un lock en Redis (que expira solo) limita el cluster a una pasada por intervalo.
+    """
+    client = get_redis()
+    if not client:
+        return 0
+    try:
+        if not client.set(SCHEDULER_LOCK_KEY, os.getpid(), nx=True, ex=max(MATERIALIZE_INTERVAL, 30)):
+            return 0
+    except redis.RedisError as e:
+        record_redis_error(e)
+        return 0
+    months = months_to_materialize(datetime.now())
+    existing = materialized_cache.mget([MATERIALIZED_KEY.format(year=year, month=month) for year, month, _ in months])
+    
+    start_time = time.time()
+    refreshed = 0
+    for (year, month, recent), value in zip(months, existing):
+        if value is not None:
+            if not recent:
+                continue
+            if time.time() - json.loads(value).get("refreshed_at", 0) < MATERIALIZE_RECENT_REFRESH:
+                continue
+        if materialize_month(year, month):
+            refreshed += 1
+    
+    scheduler_state.update(
+        last_run=datetime.now().isoformat(timespec="seconds"),
+        last_run_seconds=round(time.time() - start_time, 2)
+    )
+    scheduler_state["months_refreshed"] += refreshed
+    if refreshed:
+        logger.info(f"Materialized {refreshed} months in {scheduler_state['last_run_seconds']}s")
+    return refreshed
+
+def listen_month_updates(pubsub, deadline):
+    """
+    Hasta `deadline` escucha los "mes actualizado" que publica el worker y
+    rematerializa esos meses. Devuelve la suscripción para la siguiente
+    espera, o None si Redis falló (se vuelve a suscribir la próxima vez).
+    """
+    try:
+        if pubsub is None:
+            client = get_redis()
+            if not client:
+                time.sleep(max(0.0, min(REDIS_RECONNECT_BASE, deadline - time.time())))
+                return None
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(NEWS_EVENTS_CHANNEL)
+        while time.time() < deadline:
+            message = pubsub.get_message(timeout=max(0.0, min(1.0, deadline - time.time())))
+            if message:
+                refresh_materialized_month(json.loads(message["data"]).get("month", ""))
+        return pubsub
+    except redis.RedisError as e:
+        record_redis_error(e)
+    except Exception as e:
+        logger.error(f"Error handling month updates: {str(e)}")
+    if pubsub is not None:
+        pubsub.close()
+    time.sleep(max(0.0, min(REDIS_RECONNECT_BASE, deadline - time.time())))
+    return None
+
+def run_scheduler():
+    """
+    Bucle del scheduler de materialización: una pasada cada
+    MATERIALIZE_INTERVAL segundos y, entre pasadas, rematerializa los meses
+    que el worker anuncia como actualizados (haya o no dashboards conectados).
+    """
+    scheduler_state["running"] = True
+    logger.info("Starting materialization scheduler")
+    pubsub = None
+    while True:
+        try:
+            refresh_materialized()
+        except Exception as e:
+            logger.error(f"Error in materialization scheduler: {str(e)}")
+        deadline = time.time() + MATERIALIZE_INTERVAL
+        while time.time() < deadline:
+            pubsub = listen_month_updates(pubsub, deadline)
+
+def start_scheduler():
+    """Lanza el scheduler en un hilo de fondo si MATERIALIZE_ENABLED está activo"""
+    if not MATERIALIZE_ENABLED or scheduler_state["running"]:
+        return
+    threading.Thread(target=run_scheduler, name="materialize-scheduler", daemon=True).start()
+
+# Eventos en vivo (SSE) a partir de los "mes actualizado" que publica el worker
+NEWS_EVENTS_CHANNEL = os.getenv("NEWS_EVENTS_CHANNEL", "events:news")
+SSE_HEARTBEAT = int(os.getenv("SSE_HEARTBEAT", "15"))
+# Cada stream SSE ocupa un hilo de gunicorn: se limita a la mitad de los hilos del proceso
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", str(max(1, int(os.getenv("GUNICORN_THREADS", "8")) // 2))))
+
+class EventBroadcaster:
+    """
+    Un único suscriptor de Redis pub/sub por proceso que reparte los eventos
+    a las colas de los clientes SSE conectados. El hilo solo existe mientras
+    hay clientes, así los dashboards inactivos no cuestan nada.
+    """
+    def __init__(self, channel):
+        self.channel = channel
+        self.clients = set()
+        self.seq = 0
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def subscribe(self, max_clients=None):
+        """Registra un cliente; None si ya hay max_clients conectados"""
+        client_queue = queue.Queue(maxsize=100)
+        with self._lock:
+            if max_clients is not None and len(self.clients) >= max_clients:
+                return None
+            self.clients.add(client_queue)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sse-broadcaster", daemon=True)
+                self._thread.start()
+        return client_queue
+    
+    def unsubscribe(self, client_queue):
+        with self._lock:
+            self.clients.discard(client_queue)
+    
+    def _run(self):
+        logger.info(f"Subscribing to {self.channel}")
+        while True:
+            with self._lock:
+                if not self.clients:
+                    self._thread = None
+                    logger.info(f"No SSE clients left, unsubscribing from {self.channel}")
+                    return
+            
+            client = get_redis()
+            if not client:
+                time.sleep(REDIS_RECONNECT_BASE)
+                continue
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                while self.clients:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self._dispatch(json.loads(message["data"]))
+            except redis.RedisError as e:
+                record_redis_error(e)
+            except Exception as e:
+                logger.error(f"Error in SSE broadcaster: {str(e)}")
+            finally:
+                pubsub.close()
+    
+    def _dispatch(self, event):
+        with self._lock:
+            self.seq += 1
+            event["seq"] = self.seq
+            clients = list(self.clients)
+        for client_queue in clients:
+            try:
+                client_queue.put_nowait(event)
+            except queue.Full:
+                pass  # Cliente lento: recibirá el estado actualizado con el próximo evento
+
+news_events = EventBroadcaster(NEWS_EVENTS_CHANNEL)
+
+class RangeStateCache:
+    """
+    Último estado de correlación calculado por rango. Los streams del mismo
+    rango comparten un único cálculo por evento: el primero que llega con un
+    seq más nuevo calcula y el resto espera y recibe el mismo resultado.
+    """
+    def __init__(self, max_ranges=256):
+        self.max_ranges = max_ranges
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"computed": 0, "shared": 0}
+    
+    def get(self, key, seq, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            leader = entry is None or entry[0] < seq
+            if leader:
+                future = concurrent.futures.Future()
+                self._entries[key] = (seq, future)
+                self.stats["computed"] += 1
+                while len(self._entries) > self.max_ranges:
+                    self._entries.popitem(last=False)
+            else:
+                future = entry[1]
+                self.stats["shared"] += 1
+            self._entries.move_to_end(key)
+        
+        if leader:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+range_states = RangeStateCache()
+
+# Pool acotado para los refrescos: cada uno ocupa una conexión de Redis (ver REDIS_BACKGROUND_CONNECTIONS)
+_refresh_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MATERIALIZE_REFRESH_WORKERS,
+    thread_name_prefix="materialize-refresh"
+)
+
+def refresh_materialized_month(period):
+    """
+    Vuelve a materializar un mes actualizado por el worker si ya estaba
+    materializado. Un lock en Redis evita que lo hagan todos los procesos.
+    """
+    client = get_redis()
+    if not client or len(period) != 7:
+        return
+    year, month = period.split("-")
+    if not materialized_cache.exists(MATERIALIZED_KEY.format(year=year, month=month)):
+        return
+    try:
+        if not client.set(f"agg:materialize:lock:{year}:{month}", os.getpid(), nx=True, ex=30):
+            return
+    except redis.RedisError as e:
+        record_redis_error(e)
+        return
+    _refresh_executor.submit(materialize_month, year, month)
+
+def sse_message(event, data, event_id=None):
+    """Formatea un mensaje Server-Sent Events"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def build_aggregate(start_date_str, end_date_str, use_parallel=True, use_materialized=True):
+    """
+    Agrega y correlaciona noticias y COLCAP para un rango de fechas.
+    Retorna (resultado, código HTTP); lo usan /aggregate y el stream /events.
+    """
+    start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+    end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+    
+    logger.info(f"Aggregating data from {start_date_str} to {end_date_str}")
+    
+    # Generar lista de meses a procesar
+    months_to_process = list_months(start_date, end_date)
+    
+    logger.info(f"Processing {len(months_to_process)} months")
+    
+    # Camino rápido: todos los meses ya están materializados en Redis
+    materialized = load_materialized(months_to_process) if use_materialized else None
+    if materialized is not None:
+        merged_data, correlation_analysis = aggregate_from_materialized(
+            materialized, start_date_str, end_date_str
+        )
+        return {
+            "status": "success",
+            "period": {
+                "start": start_date_str,
+                "end": end_date_str
+            },
+            "summary": {
+                "total_data_points": len(merged_data),
+                "months_requested": len(months_to_process),
+                "months_processed": len(materialized),
+                "processing_method": "materialized",
+                "degraded": False,
+                "months_missing": [],
+                "months_from_cache": [],
+                "colcap_from_cache": False
+            },
+            "correlation": correlation_analysis,
+            "data": merged_data[:100]
+        }, 200
+    
+    # Obtener datos de noticias (con o sin paralelización)
+    news_data, months_missing, months_from_cache = fetch_news_months(months_to_process, use_parallel)
+    
+    # Obtener datos del COLCAP
+    colcap_response, colcap_source = fetch_colcap_data(start_date_str, end_date_str)
+    if not colcap_response or colcap_response.get('status') != 'success':
+        return {
+            "status": "error",
+            "message": "Failed to fetch COLCAP data"
+        }, 500
+    
+    colcap_data = colcap_response.get('data', [])
+    
+    # Preparar datos y merge por fecha
+    news_by_date, merged_data = merge_news_colcap(news_data, colcap_data)
+    
+    # Calcular correlación
+    correlation_analysis = calculate_correlation(
+        list(news_by_date.values()),
+        colcap_data
+    )
+    
+    result = {
+        "status": "success",
+        "period": {
+            "start": start_date_str,
+            "end": end_date_str
+        },
+        "summary": {
+            "total_data_points": len(merged_data),
+            "months_requested": len(months_to_process),
+            "months_processed": len(news_data),
+            "processing_method": "parallel" if use_parallel else "sequential",
+            "degraded": bool(months_missing or months_from_cache or colcap_source == "cache"),
+            "months_missing": months_missing,
+            "months_from_cache": months_from_cache,
+            "colcap_from_cache": colcap_source == "cache"
+        },
+        "correlation": correlation_analysis,
+        "data": merged_data[:100]  # Limitar a 100 puntos para la respuesta
+    }
+    
+    return result, 200
+
 @app.route("/", methods=["GET"])
 def home():
     """Página de inicio con documentación del servicio"""
@@ -115,14 +1250,19 @@ def home():
         "version": "1.0",
         "description": "Servicio para agregar y correlacionar datos de noticias con el índice COLCAP",
         "features": [
-            "Procesamiento paralelo con ThreadPoolExecutor",
+            "Procesamiento paralelo con ThreadPoolExecutor y concurrencia adaptativa (AIMD)",
             "Cálculo de correlación de Pearson",
-            "Análisis estadístico automático"
+            "Análisis estadístico automático",
+            "Circuit breakers, presupuesto de reintentos y peticiones duplicadas (hedging)",
+            "Agregados mensuales materializados en Redis con refresco en segundo plano"
         ],
         "endpoints": {
             "/health": "Health check del servicio",
-            "/aggregate": "Agregar datos de noticias y COLCAP (params: start_date, end_date, parallel)",
-            "/correlation": "Obtener solo análisis de correlación (params: start_date, end_date)"
+            "/metrics": "Métricas Prometheus (límite de concurrencia y cola del fan-out)",
+            "/events": "Stream SSE con la correlación del rango cuando cambia (params: start_date, end_date)",
+            "/aggregate": "Agregar datos de noticias y COLCAP (params: start_date, end_date, parallel, materialized)",
+            "/correlation": "Obtener solo análisis de correlación (params: start_date, end_date)",
+            "/correlation/matrix": "Matriz de correlación noticias x acciones/índices (params: start_date, end_date, symbols, top)"
         },
         "example": "GET /aggregate?start_date=2024-10-01&end_date=2024-12-31&parallel=true"
     }), 200
@@ -132,9 +1272,58 @@ def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "service": "aggregator"
+        "service": "aggregator",
+        "imports": import_stats,
+        "materialization": {
+            "enabled": MATERIALIZE_ENABLED,
+            "redis": "connected" if redis_state["available"] else "disconnected",
+            "nodes": {
+                name: "connected" if node.state["available"] else "disconnected"
+                for name, node in materialized_cache.nodes.items()
+            },
+            **scheduler_state
+        },
+        "fanout": fanout_limiter.snapshot(),
+        "events": {
+            "streams": len(news_events.clients),
+            "max_streams": SSE_MAX_STREAMS,
+            **range_states.stats
+        },
+        "dependencies": {
+            "commoncrawl": commoncrawl_client.snapshot(),
+            "colcap": colcap_client.snapshot()
+        }
     }), 200
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Métricas en formato Prometheus para autoscaling (HPA con métricas custom).
+    Suman todos los procesos gunicorn del pod, no solo el que responde el scrape.
+    """
+    fanout = fanout_snapshot_all()
+    lines = [
+        "# HELP aggregator_fanout_workers Gunicorn worker processes included in these metrics",
+        "# TYPE aggregator_fanout_workers gauge",
+        f"aggregator_fanout_workers {fanout['workers']}",
+        "# HELP aggregator_fanout_limit Sum of the adaptive concurrency limits of the month fan-out",
+        "# TYPE aggregator_fanout_limit gauge",
+        f"aggregator_fanout_limit {fanout['limit']}",
+        "# HELP aggregator_fanout_in_flight Downstream month requests in flight",
+        "# TYPE aggregator_fanout_in_flight gauge",
+        f"aggregator_fanout_in_flight {fanout['in_flight']}",
+        "# HELP aggregator_fanout_queue_depth Month requests submitted and waiting for a concurrency slot",
+        "# TYPE aggregator_fanout_queue_depth gauge",
+        f"aggregator_fanout_queue_depth {fanout['queue_depth']}",
+        "# HELP aggregator_fanout_requests_total Completed month requests",
+        "# TYPE aggregator_fanout_requests_total counter",
+        f"aggregator_fanout_requests_total {fanout['completed']}",
+        "# HELP aggregator_fanout_errors_total Month requests without a live response",
+        "# TYPE aggregator_fanout_errors_total counter",
+        f"aggregator_fanout_errors_total {fanout['errors']}"
+    ]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
 @app.route("/aggregate", methods=["GET"])
 def aggregate():
     """
@@ -143,6 +1332,7 @@ def aggregate():
     - start_date: fecha inicial (YYYY-MM-DD), default: 90 días atrás
     - end_date: fecha final (YYYY-MM-DD), default: hoy
     - parallel: usar procesamiento paralelo (true/false), default: true
+    - materialized: usar agregados materializados si existen (true/false), default: true
     """
     try:
         # Obtener parámetros
@@ -150,109 +1340,185 @@ def aggregate():
         start_date_str = request.args.get('start_date', 
                                          (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d"))
         use_parallel = request.args.get('parallel', 'true').lower() == 'true'
+        use_materialized = request.args.get('materialized', 'true').lower() == 'true'
         
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+        result, status_code = build_aggregate(start_date_str, end_date_str, use_parallel, use_materialized)
+        return jsonify(result), status_code
         
-        logger.info(f"Aggregating data from {start_date_str} to {end_date_str}")
-        
-        # Generar lista de meses a procesar
-        current = start_date
-        months_to_process = []
-        while current <= end_date:
-            months_to_process.append((current.strftime("%Y"), current.strftime("%m")))
-            # Avanzar al próximo mes
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
-            else:
-                current = current.replace(month=current.month + 1)
+    except Exception as e:
+        logger.error(f"Error in aggregation: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route("/events", methods=["GET"])
+def events():
+    """
+    Stream SSE de la correlación de un rango. Envía el estado inicial y luego
+    solo cuando el worker actualiza un mes del rango y la correlación cambia.
+    Query params: start_date, end_date (igual que /aggregate)
+    """
+    end_date_str = request.args.get('end_date', datetime.now().strftime("%Y-%m-%d"))
+    start_date_str = request.args.get('start_date',
+                                     (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d"))
+    try:
+        months = {
+            f"{year}-{month}"
+            for year, month in list_months(
+                datetime.strptime(start_date_str, "%Y-%m-%d"),
+                datetime.strptime(end_date_str, "%Y-%m-%d")
+            )
+        }
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    
+    def correlation_state(use_materialized):
+        result, _ = build_aggregate(start_date_str, end_date_str, use_materialized=use_materialized)
+        return {
+            "period": result.get("period"),
+            "correlation": result.get("correlation"),
+            "summary": result.get("summary")
+        }
+    
+    client_queue = news_events.subscribe(max_clients=SSE_MAX_STREAMS)
+    if client_queue is None:
+        response = jsonify({
+            "status": "error",
+            "message": f"Too many event streams (max {SSE_MAX_STREAMS} per process)"
+        })
+        response.headers["Retry-After"] = str(SSE_HEARTBEAT)
+        return response, 503
+    
+    def stream():
+        state = correlation_state(use_materialized=True)
+        yield sse_message("correlation", state, news_events.seq)
         
-        logger.info(f"Processing {len(months_to_process)} months")
+        while True:
+            try:
+                event = client_queue.get(timeout=SSE_HEARTBEAT)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            
+            # Agrupar los eventos ya encolados en una sola actualización
+            updated = {event.get("month")}
+            while not client_queue.empty():
+                event = client_queue.get_nowait()
+                updated.add(event.get("month"))
+            updated &= months
+            if not updated:
+                continue
+            
+            # Los datos materializados pueden estar desactualizados: camino en vivo,
+            # calculado una vez por rango y evento para todos los streams del rango
+            try:
+                new_state = range_states.get(
+                    (start_date_str, end_date_str), event["seq"],
+                    lambda: correlation_state(use_materialized=False)
+                )
+            except Exception as e:
+                logger.error(f"Error recomputing correlation for stream: {str(e)}")
+                continue
+            if new_state["correlation"] != state["correlation"]:
+                state = new_state
+                yield sse_message("correlation", {**state, "months_updated": sorted(updated)}, event["seq"])
+    
+    response = Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Se llama aunque el generador nunca llegue a ejecutarse
+    response.call_on_close(lambda: news_events.unsubscribe(client_queue))
+    return response
+
+@app.route("/correlation/matrix", methods=["GET"])
+def get_correlation_matrix():
+    """
+    Correlaciona las features de noticias (volumen y palabras clave) contra
+    varias series de acciones e índices en una sola pasada vectorizada.
+    Query params:
+    - start_date, end_date: igual que /aggregate
+    - symbols: lista separada por comas, default: todos los de colcap-fetcher
+    - parallel: usar procesamiento paralelo (true/false), default: true
+    - top: cantidad de pares más fuertes a listar, default: 10
+    """
+    try:
+        end_date_str = request.args.get('end_date', datetime.now().strftime("%Y-%m-%d"))
+        start_date_str = request.args.get('start_date',
+                                         (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d"))
+        use_parallel = request.args.get('parallel', 'true').lower() == 'true'
+        symbols_param = request.args.get('symbols')
+        symbols = [s.strip().upper() for s in symbols_param.split(',') if s.strip()] if symbols_param else None
+        top = int(request.args.get('top', 10))
         
-        # Obtener datos de noticias (con o sin paralelización)
-        news_data = []
-        if use_parallel and len(months_to_process) > 1:
-            # Procesamiento paralelo
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                future_to_date = {
-                    executor.submit(fetch_news_data, year, month): (year, month)
-                    for year, month in months_to_process
-                }
-                
-                for future in concurrent.futures.as_completed(future_to_date):
-                    result = future.result()
-                    if result:
-                        news_data.append(result)
-        else:
-            # Procesamiento secuencial
-            for year, month in months_to_process:
-                result = fetch_news_data(year, month)
-                if result:
-                    news_data.append(result)
+        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+        months_to_process = list_months(start_date, end_date)
         
-        # Obtener datos del COLCAP
-        colcap_response = fetch_colcap_data(start_date_str, end_date_str)
-        if not colcap_response or colcap_response.get('status') != 'success':
+        # Las series primero: símbolos inválidos fallan antes del fan-out de noticias
+        try:
+            series_response, series_source = fetch_series_data(symbols, start_date_str, end_date_str)
+        except DownstreamClientError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), e.status_code
+        if not series_response or series_response.get('status') != 'success':
             return jsonify({
                 "status": "error",
-                "message": "Failed to fetch COLCAP data"
+                "message": "Failed to fetch series data"
             }), 500
         
-        colcap_data = colcap_response.get('data', [])
-        
-        # Preparar datos para merge
-        news_by_date = {}
-        for news in news_data:
-            date = news.get('date')
-            # Expandir a todos los días del mes
-            year, month = date.split('-')
-            days_in_month = pd.Period(f"{year}-{month}").days_in_month
-            for day in range(1, days_in_month + 1):
-                full_date = f"{year}-{month}-{day:02d}"
-                news_by_date[full_date] = {
-                    'date': full_date,
-                    'news_count': news.get('news_count', 0),
-                    'analysis': news.get('analysis', {})
-                }
+        news_data, months_missing, months_from_cache = fetch_news_months(months_to_process, use_parallel)
         
-        # Merge de datos
-        merged_data = []
-        for colcap_entry in colcap_data:
-            date = colcap_entry['date']
-            if date in news_by_date:
-                merged_entry = {
-                    **news_by_date[date],
-                    'colcap_value': colcap_entry['value'],
-                    'colcap_change': colcap_entry['change'],
-                    'colcap_volume': colcap_entry['volume']
-                }
-                merged_data.append(merged_entry)
-        
-        # Calcular correlación
-        correlation_analysis = calculate_correlation(
-            list(news_by_date.values()),
-            colcap_data
+        features, symbols, corr, data_points = correlation_matrix(
+            news_data, series_response, start_date_str, end_date_str
         )
         
-        result = {
+        matrix = {}
+        pairs = []
+        if corr is not None:
+            for i, feature in enumerate(features):
+                matrix[feature] = {}
+                for j, symbol in enumerate(symbols):
+                    value = None if np.isnan(corr[i, j]) else round(float(corr[i, j]), 4)
+                    matrix[feature][symbol] = value
+                    if value is not None:
+                        pairs.append({"feature": feature, "symbol": symbol, "correlation": value})
+        pairs.sort(key=lambda pair: abs(pair["correlation"]), reverse=True)
+        for pair in pairs:
+            pair["interpretation"] = interpret_correlation(pair["correlation"])
+        
+        return jsonify({
             "status": "success",
             "period": {
                 "start": start_date_str,
                 "end": end_date_str
             },
             "summary": {
-                "total_data_points": len(merged_data),
+                "data_points": data_points,
+                "features": len(features),
+                "symbols": len(symbols),
+                "months_requested": len(months_to_process),
                 "months_processed": len(news_data),
-                "processing_method": "parallel" if use_parallel else "sequential"
+                "degraded": bool(months_missing or months_from_cache or series_source == "cache"),
+                "months_missing": months_missing,
+                "months_from_cache": months_from_cache,
+                "series_from_cache": series_source == "cache"
             },
-            "correlation": correlation_analysis,
-            "data": merged_data[:100]  # Limitar a 100 puntos para la respuesta
-        }
-        
-        return jsonify(result), 200
+            "features": features,
+            "symbols": symbols,
+            "matrix": matrix,
+            "strongest": pairs[:top]
+        }), 200
         
     except Exception as e:
-        logger.error(f"Error in aggregation: {str(e)}")
+        logger.error(f"Error calculating correlation matrix: {str(e)}")
         return jsonify({
             "status": "error",
             "message": str(e)
@@ -285,7 +1551,15 @@ def get_correlation():
             "message": str(e)
         }), 500
 
+import_stats["module_import_seconds"] = round(time.time() - _module_start, 3)
+
+# Servidor de desarrollo; en producción se usa gunicorn (ver gunicorn.conf.py)
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "scheduler":
+        # Entrypoint separado: solo el scheduler de materialización
+        run_scheduler()
     logger.info("Starting Aggregator Service")
+    start_warmup()
+    start_scheduler()
     app.run(host="0.0.0.0", port=5000)
 
@@ -0,0 +1,42 @@
+"""
+Configuración de Gunicorn para el servicio aggregator.
+El aggregator es I/O-bound (espera a commoncrawl y colcap), por eso usa
+pocos procesos con muchos hilos cada uno.
+Todos los valores se pueden sobrescribir con variables de entorno.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Procesos y hilos
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Timeouts y apagado ordenado (SIGTERM de Kubernetes)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Reciclar procesos periódicamente para acotar fugas de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Cargar la aplicación en el proceso maestro antes del fork. Los imports
+# pesados son diferidos; con WARMUP_ON_START=true cada proceso los calienta
+# en un hilo de fondo (ver post_worker_init)
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Heartbeat en memoria compartida para evitar bloqueos del overlayfs de Docker
+worker_tmp_dir = "/dev/shm"
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def post_worker_init(worker):
+    """Inicia el calentamiento de imports y el scheduler de materialización en cada proceso hijo"""
+    import app
+    app.start_warmup()
+    app.start_scheduler()
@@ -0,0 +1,221 @@
+"""
+Pipeline batch para backfills: ejecuta todo el flujo sin HTTP.
+
+Reutiliza como librerías las funciones de los servicios:
+- colcap-fetcher: generate_colcap_data
+- commoncrawl-worker: process_month_news (fetch simulado, duplicados y análisis)
+- aggregator: merge_news_colcap y calculate_correlation
+- plotter: render_plot de cada gráfico (PLOT_FUNCTIONS)
+
+Cada mes es una partición que se procesa en un pool de procesos y se escribe
+en Parquet. Las particiones ya escritas se saltan, así un backfill
+interrumpido se puede retomar.
+
+Uso (desde la raíz del repo):
+    python batch/pipeline.py --start 2023-01 --end 2024-12 --output output/
+"""
+import argparse
+import calendar
+import concurrent.futures
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    "colcap": "colcap-fetcher",
+    "commoncrawl": "commoncrawl-worker",
+    "aggregator": "aggregator",
+    "plotter": "plotter"
+}
+
+# Módulos de los servicios cargados en este proceso (ver load_services)
+services = {}
+
+def load_services():
+    """Importa el app.py de cada servicio como módulo (una vez por proceso)"""
+    if services:
+        return services
+    for name, directory in SERVICES.items():
+        spec = importlib.util.spec_from_file_location(
+            f"{name}_app", os.path.join(REPO_ROOT, directory, "app.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        services[name] = module
+    return services
+
+def partition_dir(output_dir, dataset, year, month):
+    """Ruta de una partición estilo Hive: dataset/year=YYYY/month=MM"""
+    return os.path.join(output_dir, dataset, f"year={year}", f"month={month}")
+
+def partition_done(output_dir, year, month):
+    """Una partición está completa si existe su marcador _SUCCESS"""
+    return os.path.exists(os.path.join(partition_dir(output_dir, "daily", year, month), "_SUCCESS"))
+
+def write_parquet(df, directory):
+    """Escribe un DataFrame en directory/part-0.parquet de forma atómica"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "part-0.parquet")
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def partition_seed(year, month):
+    """Semilla de np.random para una partición (YYYYMM)"""
+    return int(f"{year}{month}")
+
+def process_month(year, month, output_dir):
+    """
+    Procesa un mes completo y escribe sus particiones:
+    - news: métricas mensuales de noticias
+    - daily: filas diarias con noticias y COLCAP unidas
+    """
+    import numpy as np
+    import pandas as pd
+
+    svc = load_services()
+    start_time = time.time()
+
+    # Los procesos del pool heredan el mismo estado de np.random del padre:
+    # semilla por partición para que cada mes tenga su propio ruido COLCAP
+    # y el resultado no dependa de qué proceso lo tome
+    np.random.seed(partition_seed(year, month))
+
+    # Noticias (commoncrawl-worker), sin duplicados; índice de duplicados local
+    news_count, news_count_raw, analysis = svc["commoncrawl"].process_month_news(year, month)
+    news = {
+        "date": f"{year}-{month}",
+        "news_count": news_count,
+        "analysis": analysis,
+        "job_id": hashlib.md5(f"{year}{month}".encode()).hexdigest()
+    }
+
+    # COLCAP (colcap-fetcher)
+    days_in_month = calendar.monthrange(int(year), int(month))[1]
+    colcap_data = svc["colcap"].generate_colcap_data(f"{year}-{month}-01", f"{year}-{month}-{days_in_month:02d}")
+
+    # Merge (aggregator)
+    _, merged_data = svc["aggregator"].merge_news_colcap([news], colcap_data)
+
+    write_parquet(pd.DataFrame([{
+        "date": news["date"],
+        "news_count": news_count,
+        "news_count_raw": news_count_raw,
+        "duplicates_removed": analysis["duplicates_removed"],
+        "avg_relevance": analysis["avg_relevance"],
+        "total_analyzed": analysis["total_analyzed"],
+        "top_keywords": json.dumps(analysis["top_keywords"], ensure_ascii=False),
+        "job_id": news["job_id"]
+    }]), partition_dir(output_dir, "news", year, month))
+
+    daily = pd.DataFrame(merged_data).drop(columns=["analysis"])
+    daily_dir = partition_dir(output_dir, "daily", year, month)
+    write_parquet(daily, daily_dir)
+
+    # Marcador de partición completa (se escribe al final para poder retomar)
+    open(os.path.join(daily_dir, "_SUCCESS"), "w").close()
+
+    return {
+        "month": f"{year}-{month}",
+        "rows": len(daily),
+        "seconds": round(time.time() - start_time, 2)
+    }
+
+def read_daily(output_dir, months):
+    """Lee las particiones diarias de los meses pedidos en un solo DataFrame"""
+    import pandas as pd
+
+    frames = [
+        pd.read_parquet(os.path.join(partition_dir(output_dir, "daily", year, month), "part-0.parquet"))
+        for year, month in months
+        if partition_done(output_dir, year, month)
+    ]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).sort_values("date")
+
+def write_results(output_dir, months):
+    """Calcula la correlación del rango completo y renderiza los gráficos"""
+    svc = load_services()
+    daily = read_daily(output_dir, months)
+    if daily.empty:
+        logger.warning("No partitions available, skipping correlation and charts")
+        return None
+
+    records = daily.to_dict(orient="records")
+    correlation = svc["aggregator"].calculate_correlation(
+        [{"date": r["date"], "news_count": r["news_count"]} for r in records],
+        [{"date": r["date"], "value": r["colcap_value"]} for r in records]
+    )
+    with open(os.path.join(output_dir, "correlation.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "period": {"start": records[0]["date"], "end": records[-1]["date"]},
+            "correlation": correlation
+        }, f, ensure_ascii=False, indent=2)
+
+    charts_dir = os.path.join(output_dir, "charts")
+    os.makedirs(charts_dir, exist_ok=True)
+    plotter = svc["plotter"]
+    for plot_type in plotter.PLOT_FUNCTIONS:
+        images = plotter.render_plot(plot_type, records)
+        if images:
+            with open(os.path.join(charts_dir, f"{plot_type}.png"), "wb") as f:
+                f.write(images[plotter.DEFAULT_VARIANT])
+
+    return correlation
+
+def run(start_month, end_month, output_dir, workers, force=False):
+    """Procesa el rango de meses en paralelo y escribe resultados"""
+    svc = load_services()
+    months = svc["aggregator"].list_months(
+        datetime.strptime(start_month, "%Y-%m"),
+        datetime.strptime(end_month, "%Y-%m")
+    )
+    pending = [(y, m) for y, m in months if force or not partition_done(output_dir, y, m)]
+    logger.info(f"{len(months)} months in range, {len(months) - len(pending)} already written, {len(pending)} pending")
+
+    start_time = time.time()
+    failed = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        future_to_month = {
+            executor.submit(process_month, year, month, output_dir): (year, month)
+            for year, month in pending
+        }
+        for future in concurrent.futures.as_completed(future_to_month):
+            year, month = future_to_month[future]
+            try:
+                result = future.result()
+                logger.info(f"Wrote partition {result['month']} ({result['rows']} rows, {result['seconds']}s)")
+            except Exception as e:
+                logger.error(f"Error processing {year}-{month}: {str(e)}")
+                failed.append(f"{year}-{month}")
+
+    correlation = write_results(output_dir, months)
+    logger.info(f"Batch finished in {round(time.time() - start_time, 2)}s, correlation: {correlation}")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline batch de noticias y COLCAP a Parquet")
+    parser.add_argument("--start", required=True, help="Mes inicial (YYYY-MM)")
+    parser.add_argument("--end", required=True, help="Mes final (YYYY-MM)")
+    parser.add_argument("--output", default="output", help="Directorio de salida")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos del pool")
+    parser.add_argument("--force", action="store_true", help="Reprocesar particiones ya escritas")
+    args = parser.parse_args()
+
+    failed = run(args.start, args.end, args.output, args.workers, args.force)
+    if failed:
+        logger.error(f"Failed months: {', '.join(sorted(failed))}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,53 @@ def generate_colcap_data(start_date, end_date):
     
     return data
 
+# Catálogo de series simuladas: acciones colombianas e índices sectoriales.
+# Cada símbolo tiene un valor base, una tendencia en el periodo y una volatilidad diaria.
+SYMBOLS = {
+    "COLCAP": {"base": 1400, "trend": 50, "volatility": 20},
+    "COLSC": {"base": 1000, "trend": 20, "volatility": 15},
+    "COLEQTY": {"base": 950, "trend": 35, "volatility": 14},
+    "ECOPETROL": {"base": 2400, "trend": -80, "volatility": 60},
+    "PFBCOLOM": {"base": 33000, "trend": 900, "volatility": 550},
+    "BCOLOMBIA": {"base": 35000, "trend": 800, "volatility": 600},
+    "ISA": {"base": 16000, "trend": 300, "volatility": 250},
+    "GEB": {"base": 2300, "trend": 40, "volatility": 30},
+    "GRUPOSURA": {"base": 30000, "trend": 1200, "volatility": 500},
+    "GRUPOARGOS": {"base": 12000, "trend": 400, "volatility": 220},
+    "CEMARGOS": {"base": 5500, "trend": 250, "volatility": 110},
+    "NUTRESA": {"base": 45000, "trend": 500, "volatility": 400},
+    "PFAVAL": {"base": 500, "trend": -10, "volatility": 9},
+    "CELSIA": {"base": 3500, "trend": 60, "volatility": 55},
+    "CORFICOLCF": {"base": 14000, "trend": -300, "volatility": 240},
+    "PROMIGAS": {"base": 6500, "trend": 100, "volatility": 80}
+}
+
+def generate_series_data(start_date, end_date, symbols):
+    """
+    Genera datos simulados para varios símbolos en una sola pasada vectorizada.
+    Retorna las fechas y un diccionario símbolo -> lista de valores (formato columnar).
+    """
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    n_days = len(dates)
+    
+    base = np.array([SYMBOLS[s]["base"] for s in symbols], dtype=float)
+    trend = np.array([SYMBOLS[s]["trend"] for s in symbols], dtype=float)
+    volatility = np.array([SYMBOLS[s]["volatility"] for s in symbols], dtype=float)
+    
+    # Matriz (días x símbolos): base + tendencia lineal + ruido diario
+    values = (
+        base
+        + np.outer(np.linspace(0, 1, n_days), trend)
+        + np.random.normal(0, 1, (n_days, len(symbols))) * volatility
+    )
+    values = np.maximum(values, base * 0.5)  # Piso mínimo
+    values = np.round(values, 2)
+    
+    return (
+        dates.strftime("%Y-%m-%d").tolist(),
+        {symbol: values[:, i].tolist() for i, symbol in enumerate(symbols)}
+    )
+
 @app.route("/", methods=["GET"])
 def home():
     """Página de inicio con documentación del servicio"""
@@ -45,7 +92,9 @@ def home():
         "endpoints": {
             "/health": "Health check del servicio",
             "/colcap": "Obtener datos del COLCAP (params: start_date, end_date)",
-            "/colcap/latest": "Obtener el valor más reciente del COLCAP"
+            "/colcap/latest": "Obtener el valor más reciente del COLCAP",
+            "/series": "Obtener varias series en formato columnar (params: symbols, start_date, end_date)",
+            "/series/symbols": "Listar los símbolos disponibles"
         },
         "example": "GET /colcap?start_date=2024-01-01&end_date=2024-12-31"
     }), 200
@@ -110,6 +159,65 @@ def get_latest_colcap():
             "message": str(e)
         }), 500
 
+@app.route("/series", methods=["GET"])
+def get_series():
+    """
+    Obtiene varias series (acciones e índices) en una sola respuesta columnar.
+    Query params:
+    - symbols: lista separada por comas, default: todos los símbolos
+    - start_date: fecha inicial (YYYY-MM-DD), default: 90 días atrás
+    - end_date: fecha final (YYYY-MM-DD), default: hoy
+    """
+    try:
+        end_date = request.args.get('end_date')
+        start_date = request.args.get('start_date')
+        symbols_param = request.args.get('symbols')
+        
+        if not end_date:
+            end_date = datetime.now().strftime("%Y-%m-%d")
+        if not start_date:
+            start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+        
+        if symbols_param:
+            symbols = [s.strip().upper() for s in symbols_param.split(',') if s.strip()]
+        else:
+            symbols = list(SYMBOLS)
+        
+        unknown = [s for s in symbols if s not in SYMBOLS]
+        if unknown:
+            return jsonify({
+                "status": "error",
+                "message": f"Unknown symbols: {', '.join(unknown)}"
+            }), 400
+        
+        logger.info(f"Fetching {len(symbols)} series from {start_date} to {end_date}")
+        
+        dates, series = generate_series_data(start_date, end_date, symbols)
+        
+        return jsonify({
+            "status": "success",
+            "count": len(dates),
+            "symbols": symbols,
+            "dates": dates,
+            "series": series
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error fetching series data: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route("/series/symbols", methods=["GET"])
+def get_symbols():
+    """Lista los símbolos disponibles"""
+    return jsonify({
+        "status": "success",
+        "symbols": list(SYMBOLS)
+    }), 200
+
+# Servidor de desarrollo; en producción se usa gunicorn (ver gunicorn.conf.py)
 if __name__ == "__main__":
     logger.info("Starting COLCAP Fetcher Service")
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
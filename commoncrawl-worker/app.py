@@ -1,31 +1,301 @@
 import requests
 import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 import json
+import msgpack
+import os
+import sys
 import time
+import zlib
 from flask import Flask, request, jsonify
 from datetime import datetime
 import logging
 from collections import Counter
 import hashlib
+import random
+import re
+import numpy as np
+
+# Módulo compartido con el aggregator: en la imagen está junto a app.py, en el repo en shared/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from redis_nodes import DEFAULT_VNODES, RedisNode, ShardedCache, build_cache_nodes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Configuración de Redis
-REDIS_HOST = "redis"
-REDIS_PORT = 6379
-REDIS_DB = 0
+# Configuración de Redis (variables de entorno de docker-compose / k8s)
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+# Una conexión por hilo de gunicorn en cada proceso
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", os.getenv("GUNICORN_THREADS", "4")))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# Backoff exponencial entre intentos de reconexión (segundos)
+REDIS_RECONNECT_BASE = float(os.getenv("REDIS_RECONNECT_BASE", "1"))
+REDIS_RECONNECT_MAX = float(os.getenv("REDIS_RECONNECT_MAX", "30"))
+
+# Nodos de la caché de resultados ("host:puerto" separados por comas). Las
+# claves news:{año}:{mes} se reparten entre ellos con hashing consistente; el
+# resto (deduplicación, índice, eventos) vive en el nodo principal REDIS_HOST.
+REDIS_NODES = [node.strip() for node in os.getenv("REDIS_NODES", "").split(",") if node.strip()]
+REDIS_VNODES = int(os.getenv("REDIS_VNODES", str(DEFAULT_VNODES)))
+
+def make_redis_node(host, port):
+    """Nodo Redis con la configuración de pool de este servicio"""
+    return RedisNode(
+        host,
+        port,
+        reconnect_base=REDIS_RECONNECT_BASE,
+        reconnect_max=REDIS_RECONNECT_MAX,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        retry_on_timeout=True,
+        retry=Retry(ExponentialBackoff(cap=1, base=0.05), 2),
+        # Los valores de caché son binarios (ver encode_result)
+        decode_responses=False
+    )
+
+primary_node = make_redis_node(REDIS_HOST, REDIS_PORT)
+redis_client = primary_node.client
+redis_state = primary_node.state
+result_cache = ShardedCache(build_cache_nodes(primary_node, REDIS_NODES, make_redis_node), REDIS_VNODES)
+
+def get_redis():
+    """
+    Devuelve el cliente del nodo principal si está disponible, o None.
+    Las claves news:{año}:{mes} se leen y escriben con result_cache.
+    """
+    return primary_node.get()
+
+def record_redis_error(error):
+    """Registra un error del nodo principal (solo los de conexión lo marcan como no disponible)"""
+    primary_node.record_error(error)
+
+# Codificación compacta de resultados en caché.
+# Formato: 1 byte de cabecera + lista MessagePack con esquema fijo (sin nombres
+# de campos repetidos). Si zlib reduce el tamaño se guarda comprimido.
+# Las entradas antiguas en JSON (empiezan por "{") se siguen leyendo.
+CACHE_FORMAT_MSGPACK = b"\x01"
+CACHE_FORMAT_MSGPACK_ZLIB = b"\x02"
+CACHE_SCHEMA_VERSION = 2
+CACHE_COMPRESSION_LEVEL = int(os.getenv("CACHE_COMPRESSION_LEVEL", "6"))
+# Máximo de claves que /stats recorre para contabilizar memoria
+STATS_SAMPLE_KEYS = int(os.getenv("STATS_SAMPLE_KEYS", "1000"))
+
+def encode_result(result):
+    """Serializa el resultado de un mes en el formato compacto de caché"""
+    analysis = result["analysis"]
+    worker_id = result.get("worker_id", "worker-0")
+    packed = msgpack.packb([
+        CACHE_SCHEMA_VERSION,
+        result["date"],
+        result["news_count"],
+        list(analysis["top_keywords"].items()),
+        analysis["avg_relevance"],
+        analysis["total_analyzed"],
+        result["processing_time_seconds"],
+        int(worker_id.rsplit("-", 1)[-1]),
+        # Versión 2: conteos antes de eliminar duplicados
+        result.get("news_count_raw", result["news_count"]),
+        analysis.get("duplicates_removed", 0)
+    ], use_bin_type=True)
+    
+    compressed = zlib.compress(packed, CACHE_COMPRESSION_LEVEL)
+    if len(compressed) < len(packed):
+        return CACHE_FORMAT_MSGPACK_ZLIB + compressed
+    return CACHE_FORMAT_MSGPACK + packed
+
+# Errores de una entrada de caché corrupta o de un formato que este worker no conoce
+CACHE_DECODE_ERRORS = (ValueError, TypeError, IndexError, KeyError, zlib.error, msgpack.UnpackException)
+
+def decode_result(value):
+    """Deserializa un valor de caché (formato compacto o JSON antiguo)"""
+    if isinstance(value, str):
+        value = value.encode()
+    if value[:1] == b"{":
+        return json.loads(value)
+    
+    header, payload = value[:1], value[1:]
+    if header == CACHE_FORMAT_MSGPACK_ZLIB:
+        payload = zlib.decompress(payload)
+    elif header != CACHE_FORMAT_MSGPACK:
+        raise ValueError(f"Unknown cache format: {header!r}")
+    
+    fields = msgpack.unpackb(payload, raw=False)
+    (version, date, news_count, top_keywords, avg_relevance,
+     total_analyzed, processing_time, worker_number) = fields[:8]
+    # Las entradas de versión 1 no tienen conteos de duplicados
+    news_count_raw, duplicates_removed = fields[8:10] if version >= 2 else (news_count, 0)
+    year, month = date.split("-")
+    return {
+        "date": date,
+        "news_count": news_count,
+        "news_count_raw": news_count_raw,
+        "analysis": {
+            "top_keywords": dict(top_keywords),
+            "avg_relevance": avg_relevance,
+            "total_analyzed": total_analyzed,
+            "duplicates_removed": duplicates_removed,
+            "total_analyzed_raw": total_analyzed + duplicates_removed
+        },
+        "processing_time_seconds": processing_time,
+        "job_id": hashlib.md5(f"{year}{month}".encode()).hexdigest(),
+        "worker_id": f"worker-{worker_number}"
+    }
+
+def cache_memory_stats(client):
+    """
+    Contabiliza memoria de la caché recorriendo hasta STATS_SAMPLE_KEYS claves:
+    claves y tamaño medio por namespace (prefijo antes de ":") y ratio de
+    compresión de los resultados de noticias (formato compacto) frente a su
+    JSON equivalente. Si MEMORY USAGE falla (comando no soportado o sin
+    permiso) las claves se cuentan sin tamaño y el error va en "errors".
+    """
+    keys = []
+    for key in client.scan_iter(count=500):
+        keys.append(key)
+        if len(keys) >= STATS_SAMPLE_KEYS:
+            break
+    
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key)
+    sizes = pipe.execute(raise_on_error=False)
+    
+    errors = {}
+    namespaces = {}
+    news_keys = []
+    for key, size in zip(keys, sizes):
+        namespace = key.decode(errors="replace").split(":", 1)[0]
+        entry = namespaces.setdefault(namespace, {"keys": 0, "sized_keys": 0, "total_bytes": 0})
+        entry["keys"] += 1
+        if isinstance(size, Exception):
+            errors.setdefault("memory_usage", str(size))
+        else:
+            entry["sized_keys"] += 1
+            entry["total_bytes"] += size or 0
+        if namespace == "news":
+            news_keys.append(key)
+    set_average_sizes(namespaces)
+    
+    stored_bytes = 0
+    json_bytes = 0
+    legacy_entries = 0
+    unreadable_entries = 0
+    if news_keys:
+        for value in client.mget(news_keys):
+            if value is None:
+                continue
+            if value[:1] == b"{":
+                legacy_entries += 1
+                continue
+            try:
+                decoded = decode_result(value)
+            except CACHE_DECODE_ERRORS:
+                unreadable_entries += 1
+                continue
+            stored_bytes += len(value)
+            json_bytes += len(json.dumps(decoded).encode())
+    
+    stats_data = {
+        "sampled_keys": len(keys),
+        "complete": len(keys) < STATS_SAMPLE_KEYS,
+        "namespaces": namespaces,
+        "news_encoding": {
+            "format": "msgpack+zlib",
+            "stored_bytes": stored_bytes,
+            "json_bytes": json_bytes,
+            "compression_ratio": round(json_bytes / stored_bytes, 2) if stored_bytes else None,
+            "legacy_json_entries": legacy_entries,
+            "unreadable_entries": unreadable_entries
+        }
+    }
+    if errors:
+        stats_data["errors"] = errors
+    return stats_data
+
+def set_average_sizes(namespaces):
+    """Tamaño medio por namespace sobre las claves con tamaño conocido"""
+    for entry in namespaces.values():
+        entry["avg_value_bytes"] = round(entry["total_bytes"] / entry["sized_keys"], 1) if entry["sized_keys"] else None
 
-# Intentar conectar a Redis
-try:
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
-    redis_client.ping()
-    logger.info("Connected to Redis successfully")
-except:
-    logger.warning("Redis not available, running in standalone mode")
-    redis_client = None
+def merge_cache_stats(node_stats):
+    """Suma los cache_memory_stats de varios nodos en uno solo"""
+    merged = {
+        "sampled_keys": 0,
+        "complete": True,
+        "namespaces": {},
+        "news_encoding": {
+            "format": "msgpack+zlib",
+            "stored_bytes": 0,
+            "json_bytes": 0,
+            "compression_ratio": None,
+            "legacy_json_entries": 0,
+            "unreadable_entries": 0
+        }
+    }
+    encoding = merged["news_encoding"]
+    for stats_entry in node_stats:
+        merged["sampled_keys"] += stats_entry["sampled_keys"]
+        merged["complete"] = merged["complete"] and stats_entry["complete"]
+        for namespace, entry in stats_entry["namespaces"].items():
+            total = merged["namespaces"].setdefault(namespace, {"keys": 0, "sized_keys": 0, "total_bytes": 0})
+            for field in ("keys", "sized_keys", "total_bytes"):
+                total[field] += entry[field]
+        for field in ("stored_bytes", "json_bytes", "legacy_json_entries", "unreadable_entries"):
+            encoding[field] += stats_entry["news_encoding"][field]
+    set_average_sizes(merged["namespaces"])
+    if encoding["stored_bytes"]:
+        encoding["compression_ratio"] = round(encoding["json_bytes"] / encoding["stored_bytes"], 2)
+    return merged
+
+def cache_node_stats(node, ring_share=None):
+    """
+    Estado de un nodo Redis: conexión, fracción del anillo de la caché (None si
+    no forma parte), claves totales, memoria y cache_memory_stats del nodo.
+    Cada comando se consulta por separado: si uno falla (p. ej. INFO o MEMORY
+    no soportados) su error va en "errors" y el nodo sigue disponible.
+    """
+    entry = {
+        "node": node.name,
+        "connected": False,
+        "ring_share": ring_share
+    }
+    client = node.get()
+    if client:
+        entry["connected"] = True
+        errors = {}
+        queries = (
+            ("keys", lambda: client.dbsize()),
+            ("memory", lambda: client.info('memory').get('used_memory_human', 'N/A')),
+            ("cache", lambda: cache_memory_stats(client))
+        )
+        for field, query in queries:
+            try:
+                entry[field] = query()
+            except redis.RedisError as e:
+                node.record_error(e)
+                if not node.state["available"]:
+                    entry["connected"] = False
+                    break
+                errors[field] = str(e)
+        if errors:
+            entry["errors"] = errors
+    entry.update(
+        failures=node.state["failures"],
+        command_errors=node.state["command_errors"],
+        last_error=node.state["last_error"]
+    )
+    return entry
 
 # Palabras clave económicas para análisis
 ECONOMIC_KEYWORDS = [
@@ -35,27 +305,215 @@ ECONOMIC_KEYWORDS = [
     'deuda', 'fiscal', 'presupuesto', 'tasa', 'interés', 'colcap'
 ]
 
+# Medios que republican (sindican) las mismas noticias
+NEWS_SOURCES = [
+    'eltiempo.com', 'elespectador.com', 'portafolio.co', 'larepublica.co',
+    'semana.com', 'valoraanalitik.com', 'elcolombiano.com', 'dinero.com'
+]
+
+# Vocabulario para simular el texto de las noticias
+FILLER_WORDS = [
+    'gobierno', 'ministerio', 'hacienda', 'anuncio', 'analistas', 'según',
+    'informe', 'trimestre', 'año', 'semana', 'cifras', 'reportó', 'aumento',
+    'caída', 'expectativas', 'sector', 'empresas', 'hogares', 'precios',
+    'consumo', 'reforma', 'congreso', 'proyecto', 'medidas', 'riesgo',
+    'calificación', 'inversionistas', 'extranjeros', 'región', 'país',
+    'mayor', 'menor', 'nivel', 'histórico', 'récord', 'millones', 'billones',
+    'puntos', 'porcentuales', 'meta'
+]
+
+def stable_hash(value):
+    """
+    Hash entero estable entre procesos (hash() cambia con PYTHONHASHSEED en
+    cada réplica). La simulación lo usa para que un mismo id de noticia tenga
+    el mismo texto en todas las réplicas que comparten el índice en Redis.
+    """
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+def simulate_story_text(year, month, story):
+    """Genera el cuerpo (determinista) de una noticia simulada"""
+    rng = random.Random(f"{year}{month}{story}")
+    return " ".join(rng.choice(ECONOMIC_KEYWORDS + FILLER_WORDS) for _ in range(60))
+
 def simulate_commoncrawl_fetch(year, month):
     """
     Simula el fetch de noticias de Common Crawl.
     En producción real, esto consultaría el índice de Common Crawl.
+    Alrededor de un 25% de las noticias son copias sindicadas de otra
+    noticia del mismo mes publicadas por otro medio.
     """
     # Simular diferentes volúmenes de noticias económicas por mes
     base_count = 1500
-    variation = int((hash(f"{year}{month}") % 500) - 250)
+    variation = int((stable_hash(f"{year}{month}") % 500) - 250)
     news_count = max(base_count + variation, 800)
     
     # Simular análisis de contenido
     simulated_news = []
     for i in range(min(news_count, 100)):  # Limitamos a 100 para el ejemplo
+        story = i
+        if i > 0 and stable_hash(f"{year}{month}{i}syndicated") % 4 == 0:
+            story = stable_hash(f"{year}{month}{i}original") % i
+        source = NEWS_SOURCES[stable_hash(f"{year}{month}{i}source") % len(NEWS_SOURCES)]
         simulated_news.append({
-            "title": f"Noticia económica {i+1} - {year}-{month}",
-            "keywords_found": [kw for kw in ECONOMIC_KEYWORDS if hash(f"{i}{kw}") % 3 == 0],
-            "relevance_score": round((hash(f"{year}{month}{i}") % 100) / 100, 2)
+            "id": hashlib.md5(f"{year}{month}{i}".encode()).hexdigest()[:16],
+            "url": f"https://{source}/economia/{year}/{month}/noticia-{story + 1}",
+            "title": f"Noticia económica {story+1} - {year}-{month}",
+            "content": f"{source} {simulate_story_text(year, month, story)}",
+            "keywords_found": [kw for kw in ECONOMIC_KEYWORDS if stable_hash(f"{story}{kw}") % 3 == 0],
+            "relevance_score": round((stable_hash(f"{year}{month}{story}") % 100) / 100, 2)
         })
     
     return news_count, simulated_news
 
+# Detección de casi-duplicados con MinHash + LSH por bandas.
+# Las permutaciones usan una semilla fija para que todas las réplicas
+# generen firmas compatibles sobre el índice compartido en Redis.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_SHINGLE_SIZE = 3
+DEDUP_BANDS = 16
+DEDUP_ROWS = 4
+DEDUP_NUM_PERM = DEDUP_BANDS * DEDUP_ROWS
+# Límite de documentos indexados por mes en Redis (memoria acotada)
+DEDUP_MAX_DOCS = int(os.getenv("DEDUP_MAX_DOCS", "200000"))
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", str(7 * 24 * 3600)))
+DEDUP_CHUNK_SIZE = 256
+
+_MINHASH_PRIME = (1 << 31) - 1
+_minhash_rng = np.random.RandomState(42)
+_MINHASH_A = _minhash_rng.randint(1, _MINHASH_PRIME, DEDUP_NUM_PERM).astype(np.uint64)
+_MINHASH_B = _minhash_rng.randint(0, _MINHASH_PRIME, DEDUP_NUM_PERM).astype(np.uint64)
+
+def minhash_signature(text):
+    """Firma MinHash (uint32 x DEDUP_NUM_PERM) de los shingles de palabras del texto"""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {
+        " ".join(words[i:i + DEDUP_SHINGLE_SIZE])
+        for i in range(max(len(words) - DEDUP_SHINGLE_SIZE + 1, 1))
+    }
+    hashes = np.fromiter((zlib.crc32(sh.encode()) for sh in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * h + b) mod p para todas las permutaciones a la vez; cabe en uint64
+    return ((np.outer(hashes, _MINHASH_A) + _MINHASH_B) % _MINHASH_PRIME).min(axis=0).astype(np.uint32)
+
+def lsh_bands(signature):
+    """Claves de bucket LSH (una por banda) de una firma"""
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * DEDUP_ROWS:(band + 1) * DEDUP_ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(DEDUP_BANDS)
+    ]
+
+def deduplicate_news(year, month, news_list, client=None):
+    """
+    Elimina noticias casi duplicadas (similitud de Jaccard estimada >= DEDUP_THRESHOLD).
+    Procesa en bloques: por bloque consulta el índice LSH del mes en Redis
+    (compartido entre réplicas) y registra las noticias nuevas. Sin Redis
+    usa solo un índice local.
+    Retorna (noticias únicas, cantidad de duplicados).
+    """
+    bands_key = f"dedup:{year}:{month}:bands"
+    sigs_key = f"dedup:{year}:{month}:sigs"
+    local_bands = {}
+    local_sigs = {}
+    unique = []
+    duplicates = 0
+    
+    can_register = True
+    if client:
+        try:
+            can_register = client.hlen(sigs_key) < DEDUP_MAX_DOCS
+        except redis.RedisError as e:
+            record_redis_error(e)
+            client = None
+    
+    for start in range(0, len(news_list), DEDUP_CHUNK_SIZE):
+        chunk = news_list[start:start + DEDUP_CHUNK_SIZE]
+        signatures = [minhash_signature(news.get('content') or news.get('title', '')) for news in chunk]
+        chunk_bands = [lsh_bands(sig) for sig in signatures]
+        
+        # Candidatos del índice compartido (un round-trip por bloque)
+        remote_bands = [[None] * DEDUP_BANDS for _ in chunk]
+        remote_sigs = {}
+        if client:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for bands in chunk_bands:
+                    pipe.hmget(bands_key, bands)
+                remote_bands = [[v.decode() if v else None for v in values] for values in pipe.execute()]
+                candidate_ids = sorted({v for values in remote_bands for v in values if v})
+                if candidate_ids:
+                    for doc_id, raw in zip(candidate_ids, client.hmget(sigs_key, candidate_ids)):
+                        if raw:
+                            remote_sigs[doc_id] = np.frombuffer(raw, dtype=np.uint32)
+            except redis.RedisError as e:
+                record_redis_error(e)
+                client = None
+        
+        new_entries = {}
+        for news, signature, bands, remote in zip(chunk, signatures, chunk_bands, remote_bands):
+            doc_id = news.get('id') or hashlib.md5(news.get('url', news.get('title', '')).encode()).hexdigest()[:16]
+            candidates = {local_bands.get(band) for band in bands} | set(remote)
+            candidates.discard(None)
+            candidates.discard(doc_id)  # La misma noticia procesada antes no es duplicado
+            
+            is_duplicate = False
+            for candidate in candidates:
+                candidate_sig = local_sigs.get(candidate)
+                if candidate_sig is None:
+                    candidate_sig = remote_sigs.get(candidate)
+                if candidate_sig is not None and np.mean(candidate_sig == signature) >= DEDUP_THRESHOLD:
+                    is_duplicate = True
+                    break
+            
+            if is_duplicate:
+                duplicates += 1
+                continue
+            
+            unique.append(news)
+            local_sigs[doc_id] = signature
+            for band in bands:
+                local_bands.setdefault(band, doc_id)
+            new_entries[doc_id] = (signature, bands)
+        
+        # Registrar las noticias nuevas en el índice compartido
+        if client and can_register and new_entries:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for doc_id, (signature, bands) in new_entries.items():
+                    pipe.hset(sigs_key, doc_id, signature.tobytes())
+                    for band in bands:
+                        pipe.hsetnx(bands_key, band, doc_id)
+                pipe.expire(bands_key, DEDUP_TTL)
+                pipe.expire(sigs_key, DEDUP_TTL)
+                pipe.execute()
+            except redis.RedisError as e:
+                record_redis_error(e)
+                client = None
+    
+    return unique, duplicates
+
+def process_month_news(year, month, client=None):
+    """
+    Simula el fetch de un mes, elimina duplicados y analiza el contenido.
+    Retorna (news_count deduplicado, news_count bruto, análisis).
+    """
+    news_count_raw, news_data = simulate_commoncrawl_fetch(year, month)
+    
+    duplicates = 0
+    if DEDUP_ENABLED and news_data:
+        news_data, duplicates = deduplicate_news(year, month, news_data, client)
+    
+    analysis = analyze_news_content(news_data)
+    analysis["duplicates_removed"] = duplicates
+    
+    if client:
+        index_keywords(year, month, news_data, client)
+    analysis["total_analyzed_raw"] = len(news_data) + duplicates
+    
+    # Extrapolar la proporción de duplicados de la muestra al total del mes
+    sample_size = analysis["total_analyzed_raw"]
+    news_count = round(news_count_raw * len(news_data) / sample_size) if sample_size else news_count_raw
+    return news_count, news_count_raw, analysis
+
 def analyze_news_content(news_list):
     """Analiza el contenido de las noticias y extrae métricas"""
     all_keywords = []
@@ -74,10 +532,74 @@ def analyze_news_content(news_list):
         "total_analyzed": len(news_list)
     }
 
+# Canal de eventos "mes actualizado" para los streams SSE del aggregator/plotter
+NEWS_EVENTS_CHANNEL = os.getenv("NEWS_EVENTS_CHANNEL", "events:news")
+
+def publish_month_updated(client, result):
+    """Publica en Redis pub/sub que se escribió news:{year}:{month}"""
+    try:
+        client.publish(NEWS_EVENTS_CHANNEL, json.dumps({
+            "event": "month_updated",
+            "month": result["date"],
+            "news_count": result["news_count"]
+        }))
+    except redis.RedisError as e:
+        record_redis_error(e)
+
+# Índice invertido de palabras clave en Redis:
+# - kwidx:{palabra}:counts  hash "YYYY-MM" -> menciones en el mes
+# - kwidx:{palabra}:{YYYY-MM}:docs  set de ids de noticias (acotado)
+# - kwidx:keywords / kwidx:months  palabras y meses indexados
+KEYWORD_INDEX_MAX_DOCS = int(os.getenv("KEYWORD_INDEX_MAX_DOCS", "500"))
+
+def keyword_key(keyword):
+    return f"kwidx:{keyword.lower()}"
+
+def index_keywords(year, month, news_list, client):
+    """
+    Actualiza el índice invertido con las noticias (ya sin duplicados) de un mes.
+    Reemplaza los datos previos del mes, así reprocesar es idempotente.
+    """
+    period = f"{year}-{month}"
+    docs_by_keyword = {}
+    for news in news_list:
+        for keyword in news.get('keywords_found', []):
+            docs_by_keyword.setdefault(keyword.lower(), []).append(news.get('id') or news.get('title', ''))
+    
+    try:
+        previous = client.smembers("kwidx:keywords")
+        pipe = client.pipeline(transaction=False)
+        # Palabras que ya no aparecen en el mes quedan en 0
+        for keyword in {k.decode() for k in previous} - set(docs_by_keyword):
+            pipe.hdel(f"{keyword_key(keyword)}:counts", period)
+            pipe.delete(f"{keyword_key(keyword)}:{period}:docs")
+        for keyword, doc_ids in docs_by_keyword.items():
+            pipe.hset(f"{keyword_key(keyword)}:counts", period, len(doc_ids))
+            docs_key = f"{keyword_key(keyword)}:{period}:docs"
+            pipe.delete(docs_key)
+            pipe.sadd(docs_key, *doc_ids[:KEYWORD_INDEX_MAX_DOCS])
+        if docs_by_keyword:
+            pipe.sadd("kwidx:keywords", *docs_by_keyword)
+        pipe.sadd("kwidx:months", period)
+        pipe.execute()
+    except redis.RedisError as e:
+        record_redis_error(e)
+
+def months_between(start, end):
+    """Lista los meses "YYYY-MM" entre dos meses, ambos inclusive (ValueError si no son YYYY-MM)"""
+    start, end = datetime.strptime(start, "%Y-%m"), datetime.strptime(end, "%Y-%m")
+    year, month = start.year, start.month
+    end_year, end_month = end.year, end.month
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
 @app.route("/", methods=["GET"])
 def home():
     """Página de inicio con documentación del servicio"""
-    redis_status = "connected" if redis_client else "disconnected"
+    redis_status = "connected" if get_redis() else "disconnected"
     return jsonify({
         "service": "CommonCrawl Worker Service",
         "version": "1.0",
@@ -87,15 +609,17 @@ def home():
             "/health": "Health check del servicio",
             "/process": "Procesar noticias de un mes específico (params: year, month)",
             "/process/batch": "Procesar múltiples meses en paralelo (POST)",
-            "/stats": "Estadísticas del worker y Redis"
+            "/stats": "Estadísticas del worker y de cada nodo Redis de la caché",
+            "/keywords": "Series mensuales de palabras clave desde el índice invertido (params: keywords, start, end, articles)"
         },
+        "deduplication": "MinHash + LSH sobre el texto de las noticias (news_count sin duplicados, news_count_raw con ellos)",
         "example": "GET /process?year=2024&month=10"
     }), 200
 
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint"""
-    redis_status = "connected" if redis_client else "disconnected"
+    redis_status = "connected" if get_redis() else "disconnected"
     return jsonify({
         "status": "healthy",
         "service": "commoncrawl-worker",
@@ -119,41 +643,44 @@ def process():
         
         logger.info(f"Processing news for {year}-{month} (job_id: {job_id})")
         
-        # Verificar si ya está en caché (Redis)
-        if redis_client:
-            cached = redis_client.get(f"news:{year}:{month}")
-            if cached:
+        # Verificar si ya está en caché (nodo Redis dueño de la clave)
+        cache_key = f"news:{year}:{month}"
+        cached = result_cache.get(cache_key)
+        if cached:
+            try:
+                result = decode_result(cached)
                 logger.info(f"Returning cached data for {year}-{month}")
-                return jsonify(json.loads(cached)), 200
+                # El aggregator compara la latencia de aciertos y fallos por separado
+                return jsonify({**result, "cached": True}), 200
+            except CACHE_DECODE_ERRORS as e:
+                # Entrada ilegible: se recalcula como un fallo de caché y se sobrescribe
+                logger.warning(f"Ignoring unreadable cache entry {cache_key}: {e!r}")
         
-        # Simular procesamiento (en producción, esto consultaría Common Crawl)
+        # Simular procesamiento (en producción, esto consultaría Common Crawl),
+        # eliminar duplicados y analizar contenido
         start_time = time.time()
-        news_count, news_data = simulate_commoncrawl_fetch(year, month)
-        
-        # Analizar contenido
-        analysis = analyze_news_content(news_data)
+        news_count, news_count_raw, analysis = process_month_news(year, month, get_redis())
         
         processing_time = round(time.time() - start_time, 2)
         
         result = {
             "date": f"{year}-{month}",
             "news_count": news_count,
+            "news_count_raw": news_count_raw,
             "analysis": analysis,
             "processing_time_seconds": processing_time,
             "job_id": job_id,
             "worker_id": f"worker-{hash(str(time.time())) % 1000}"
         }
         
-        # Guardar en caché si Redis está disponible
-        if redis_client:
-            redis_client.setex(
-                f"news:{year}:{month}",
-                3600,  # TTL de 1 hora
-                json.dumps(result)
-            )
-            logger.info(f"Cached result for {year}-{month}")
+        # Guardar en caché si el nodo dueño de la clave está disponible
+        if result_cache.set(cache_key, encode_result(result), ex=3600):  # TTL de 1 hora
+            logger.info(f"Cached result for {year}-{month} on {result_cache.ring.node_for(cache_key)}")
+            client = get_redis()
+            if client:
+                publish_month_updated(client, result)
         
-        return jsonify(result), 200
+        return jsonify({**result, "cached": False}), 200
         
     except Exception as e:
         logger.error(f"Error processing news: {str(e)}")
@@ -184,12 +711,12 @@ def process_batch():
             month = date_obj.get('month')
             
             # Procesar cada fecha
-            news_count, news_data = simulate_commoncrawl_fetch(year, month)
-            analysis = analyze_news_content(news_data)
+            news_count, news_count_raw, analysis = process_month_news(year, month, get_redis())
             
             results.append({
                 "date": f"{year}-{month}",
                 "news_count": news_count,
+                "news_count_raw": news_count_raw,
                 "analysis": analysis
             })
         
@@ -206,21 +733,124 @@ def process_batch():
             "message": str(e)
         }), 500
 
+@app.route("/keywords", methods=["GET"])
+def keywords():
+    """
+    Consulta el índice invertido sin recalcular nada.
+    Query params:
+    - keywords: lista separada por comas, default: todas las indexadas
+    - start: mes inicial (YYYY-MM), default: primer mes indexado
+    - end: mes final (YYYY-MM), default: último mes indexado
+    - articles: incluir ids de noticias por mes (true/false), default: false
+    """
+    start = request.args.get('start')
+    end = request.args.get('end')
+    try:
+        for value in (start, end):
+            if value is not None:
+                datetime.strptime(value, "%Y-%m")
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    
+    try:
+        client = get_redis()
+        if not client:
+            return jsonify({
+                "status": "error",
+                "message": "Keyword index requires Redis"
+            }), 503
+        
+        keywords_param = request.args.get('keywords')
+        include_articles = request.args.get('articles', 'false').lower() == 'true'
+        
+        pipe = client.pipeline(transaction=False)
+        pipe.smembers("kwidx:months")
+        pipe.smembers("kwidx:keywords")
+        indexed_months, indexed_keywords = pipe.execute()
+        indexed_months = sorted(m.decode() for m in indexed_months)
+        
+        if keywords_param:
+            keyword_list = [k.strip().lower() for k in keywords_param.split(',') if k.strip()]
+        else:
+            keyword_list = sorted(k.decode() for k in indexed_keywords)
+        
+        if not indexed_months:
+            months = months_between(start, end) if start and end else []
+        else:
+            months = months_between(start or indexed_months[0], end or indexed_months[-1])
+        
+        # Todas las series en un solo round-trip
+        counts = [[] for _ in keyword_list]
+        if months:
+            pipe = client.pipeline(transaction=False)
+            for keyword in keyword_list:
+                pipe.hmget(f"{keyword_key(keyword)}:counts", months)
+            counts = pipe.execute()
+        
+        series = {}
+        totals = {}
+        for keyword, values in zip(keyword_list, counts):
+            series[keyword] = {month: int(v) if v else 0 for month, v in zip(months, values)}
+            totals[keyword] = sum(series[keyword].values())
+        
+        result = {
+            "status": "success",
+            "months": months,
+            "months_not_indexed": sorted(set(months) - set(indexed_months)),
+            "series": series,
+            "totals": totals
+        }
+        
+        if include_articles:
+            pipe = client.pipeline(transaction=False)
+            pairs = [(k, m) for k in keyword_list for m in months if series[k][m]]
+            for keyword, month in pairs:
+                pipe.smembers(f"{keyword_key(keyword)}:{month}:docs")
+            articles = {}
+            for (keyword, month), doc_ids in zip(pairs, pipe.execute()):
+                articles.setdefault(keyword, {})[month] = sorted(d.decode() for d in doc_ids)
+            result["articles"] = articles
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        logger.error(f"Error querying keyword index: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 @app.route("/stats", methods=["GET"])
 def stats():
     """Obtiene estadísticas del worker"""
     try:
+        client = get_redis()
         stats_data = {
             "service": "commoncrawl-worker",
-            "redis_connected": redis_client is not None,
+            "redis_connected": client is not None,
+            "redis_pool": {
+                "max_connections": REDIS_MAX_CONNECTIONS,
+                "failures": redis_state["failures"],
+                "last_error": redis_state["last_error"]
+            },
             "uptime": "running"
         }
         
-        if redis_client:
-            # Obtener estadísticas de Redis
-            info = redis_client.info()
-            stats_data["redis_keys"] = redis_client.dbsize()
-            stats_data["redis_memory"] = info.get('used_memory_human', 'N/A')
+        # Todos los nodos en uso: los de la caché repartida y el principal si no está en el anillo
+        shares = result_cache.ring.shares()
+        nodes = list(result_cache.nodes.values())
+        if primary_node.name not in result_cache.nodes:
+            nodes.append(primary_node)
+        node_stats = [cache_node_stats(node, shares.get(node.name)) for node in nodes]
+        
+        stats_data["redis_connected"] = primary_node.state["available"]
+        stats_data["redis_keys"] = sum(entry.get("keys", 0) for entry in node_stats)
+        stats_data["cache"] = merge_cache_stats([entry["cache"] for entry in node_stats if "cache" in entry])
+        stats_data["cache"]["nodes_missing"] = [entry["node"] for entry in node_stats if "cache" not in entry]
+        stats_data["cache_nodes"] = node_stats
         
         return jsonify(stats_data), 200
         
@@ -231,6 +861,7 @@ def stats():
             "message": str(e)
         }), 500
 
+# Servidor de desarrollo; en producción se usa gunicorn (ver gunicorn.conf.py)
 if __name__ == "__main__":
     logger.info("Starting CommonCrawl Worker Service")
     app.run(host="0.0.0.0", port=5000)
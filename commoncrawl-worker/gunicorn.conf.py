@@ -0,0 +1,33 @@
+"""
+Configuración de Gunicorn para el servicio commoncrawl-worker.
+El worker combina CPU (análisis de contenido) y I/O (Redis), por eso usa
+dos procesos con algunos hilos cada uno.
+Todos los valores se pueden sobrescribir con variables de entorno.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Procesos y hilos
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Timeouts y apagado ordenado (SIGTERM de Kubernetes)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Reciclar procesos periódicamente para acotar fugas de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Cargar la aplicación (e imports pesados) en el proceso maestro antes del fork
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Heartbeat en memoria compartida para evitar bloqueos del overlayfs de Docker
+worker_tmp_dir = "/dev/shm"
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
@@ -13,10 +13,10 @@ function Build-Images {
     docker build -t colcap-fetcher:latest ./colcap-fetcher
     if ($LASTEXITCODE -ne 0) { Write-Error "Error construyendo colcap-fetcher"; exit 1 }
     
-    docker build -t commoncrawl-worker:latest ./commoncrawl-worker
+    docker build -t commoncrawl-worker:latest -f commoncrawl-worker/Dockerfile .
     if ($LASTEXITCODE -ne 0) { Write-Error "Error construyendo commoncrawl-worker"; exit 1 }
     
-    docker build -t aggregator:latest ./aggregator
+    docker build -t aggregator:latest -f aggregator/Dockerfile .
     if ($LASTEXITCODE -ne 0) { Write-Error "Error construyendo aggregator"; exit 1 }
     
     docker build -t plotter:latest ./plotter
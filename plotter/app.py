@@ -1,35 +1,142 @@
+import time
+_module_start = time.time()
+
 import requests
-import matplotlib
-matplotlib.use('Agg')  # Backend sin GUI
-import matplotlib.pyplot as plt
-import seaborn as sns
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context, url_for
 from datetime import datetime
 import logging
 import io
+import json
+import os
+import queue
 import base64
-import pandas as pd
-import numpy as np
+import threading
+import concurrent.futures
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Configurar estilo de gráficos
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 6)
-
 AGGREGATOR_URL = "http://aggregator:5000/aggregate"
+AGGREGATOR_EVENTS_URL = "http://aggregator:5000/events"
+SSE_HEARTBEAT = int(os.getenv("SSE_HEARTBEAT", "15"))
+# Cada stream SSE ocupa un hilo de gunicorn: se limita a la mitad de los hilos
+# del proceso para que /plot y /health sigan teniendo hilos libres
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", str(max(1, int(os.getenv("GUNICORN_THREADS", "4")) // 2))))
+SSE_RETRY_SECONDS = 5
+
+# Librerías pesadas: se importan en el primer uso (ver load_plotting_libs)
+plt = None
+sns = None
+pd = None
+np = None
+
+# Calentar las librerías en un hilo de fondo al arrancar (true/false)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"
+
+_import_lock = threading.Lock()
+import_stats = {
+    "plotting_libs_loaded": False,
+    "plotting_libs_import_seconds": None,
+    "module_import_seconds": None
+}
+
+def load_plotting_libs():
+    """
+    Importa matplotlib, seaborn, pandas y numpy la primera vez que se necesitan.
+    Así /health responde sin esperar a las librerías de gráficos.
+    """
+    global plt, sns, pd, np
+    if import_stats["plotting_libs_loaded"]:
+        return
+    
+    with _import_lock:
+        if import_stats["plotting_libs_loaded"]:
+            return
+        
+        start_time = time.time()
+        import matplotlib
+        matplotlib.use('Agg')  # Backend sin GUI
+        import matplotlib.pyplot as _plt
+        import seaborn as _sns
+        import pandas as _pd
+        import numpy as _np
+        
+        # Configurar estilo de gráficos
+        _sns.set_style("whitegrid")
+        _plt.rcParams['figure.figsize'] = (12, 6)
+        
+        plt, sns, pd, np = _plt, _sns, _pd, _np
+        import_stats["plotting_libs_import_seconds"] = round(time.time() - start_time, 3)
+        import_stats["plotting_libs_loaded"] = True
+        logger.info(f"Plotting libraries loaded in {import_stats['plotting_libs_import_seconds']}s")
+
+def start_warmup():
+    """Lanza la importación de librerías en un hilo de fondo si WARMUP_ON_START está activo"""
+    if not WARMUP_ON_START or import_stats["plotting_libs_loaded"]:
+        return
+    threading.Thread(target=load_plotting_libs, name="plotting-warmup", daemon=True).start()
+
+class SingleFlight:
+    """
+    Coalesce llamadas concurrentes con la misma clave: la primera ejecuta la
+    función y las demás esperan y reciben el mismo resultado (o excepción).
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.stats = {"executed": 0, "coalesced": 0}
+    
+    def do(self, key, fn, *args):
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._in_flight[key] = future
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        
+        if not leader:
+            logger.info(f"Coalescing {self.name} request {key}")
+            return future.result()
+        
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
 
-def fetch_aggregated_data(start_date=None, end_date=None):
-    """Obtiene datos agregados del servicio aggregator"""
+# Peticiones idénticas en vuelo comparten el fetch al aggregator y el render
+data_flight = SingleFlight("aggregator fetch")
+render_flight = SingleFlight("render")
+
+# pyplot usa estado global y no es thread-safe: un render a la vez por proceso
+_render_lock = threading.Lock()
+
+def fetch_aggregated_data_shared(start_date=None, end_date=None, fresh=False):
+    """fetch_aggregated_data compartido entre peticiones concurrentes del mismo rango"""
+    return data_flight.do((start_date, end_date, fresh), fetch_aggregated_data, start_date, end_date, fresh)
+
+def fetch_aggregated_data(start_date=None, end_date=None, fresh=False):
+    """
+    Obtiene datos agregados del servicio aggregator.
+    Con fresh=True se saltan los agregados materializados (datos recién actualizados).
+    """
     try:
         params = {}
         if start_date:
             params['start_date'] = start_date
         if end_date:
             params['end_date'] = end_date
+        if fresh:
+            params['materialized'] = 'false'
         
         logger.info(f"Fetching data from aggregator with params: {params}")
         response = requests.get(AGGREGATOR_URL, params=params, timeout=60)
@@ -48,6 +155,8 @@ def fetch_aggregated_data(start_date=None, end_date=None):
 
 def create_correlation_plot(data):
     """Crea gráfico de correlación entre noticias y COLCAP"""
+    load_plotting_libs()
+    
     try:
         df = pd.DataFrame(data)
         
@@ -88,13 +197,7 @@ def create_correlation_plot(data):
         
         fig.tight_layout()
         
-        # Guardar en buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-        
-        return buf
+        return fig
         
     except Exception as e:
         logger.error(f"Error creating correlation plot: {str(e)}")
@@ -102,6 +205,8 @@ def create_correlation_plot(data):
 
 def create_scatter_plot(data):
     """Crea gráfico de dispersión para visualizar correlación"""
+    load_plotting_libs()
+    
     try:
         df = pd.DataFrame(data)
         
@@ -139,13 +244,7 @@ def create_scatter_plot(data):
         
         fig.tight_layout()
         
-        # Guardar en buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-        
-        return buf
+        return fig
         
     except Exception as e:
         logger.error(f"Error creating scatter plot: {str(e)}")
@@ -153,6 +252,8 @@ def create_scatter_plot(data):
 
 def create_heatmap(data):
     """Crea un heatmap de la actividad por día/semana"""
+    load_plotting_libs()
+    
     try:
         df = pd.DataFrame(data)
         
@@ -189,17 +290,125 @@ def create_heatmap(data):
         
         fig.tight_layout()
         
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-        
-        return buf
+        return fig
         
     except Exception as e:
         logger.error(f"Error creating heatmap: {str(e)}")
         return None
 
+# Cada función construye la figura; render_plot la guarda en los formatos pedidos
+PLOT_FUNCTIONS = {
+    'correlation': create_correlation_plot,
+    'scatter': create_scatter_plot,
+    'heatmap': create_heatmap
+}
+
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml'
+}
+
+# Tamaños nombrados (dpi); el parámetro dpi los sobreescribe dentro de [MIN_DPI, MAX_DPI]
+IMAGE_SIZES = {
+    'thumbnail': int(os.getenv("THUMBNAIL_DPI", "50")),
+    'full': int(os.getenv("FULL_DPI", "150"))
+}
+MIN_DPI = 30
+MAX_DPI = 300
+DEFAULT_VARIANT = ('png', IMAGE_SIZES['full'])
+
+# PNG con paleta de 256 colores: ~2.5x más liviano que RGBA para estos gráficos
+PNG_QUANTIZE = os.getenv("PNG_QUANTIZE", "true").lower() == "true"
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+
+# Cache-Control de las imágenes de /plot (segundos)
+PLOT_MAX_AGE = int(os.getenv("PLOT_MAX_AGE", "60"))
+
+def resolve_variant(output_format='png', size='full', dpi=None):
+    """
+    Convierte formato, tamaño y dpi en una variante (formato, dpi).
+    Lanza ValueError si algún valor no es válido.
+    """
+    if output_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown format: {output_format}")
+    if dpi is not None:
+        dpi = min(max(int(dpi), MIN_DPI), MAX_DPI)
+    elif size in IMAGE_SIZES:
+        dpi = IMAGE_SIZES[size]
+    else:
+        raise ValueError(f"Unknown size: {size}")
+    if output_format == 'svg':
+        # Vectorial: el dpi no cambia el resultado, así todas las variantes comparten render
+        dpi = IMAGE_SIZES['full']
+    return (output_format, dpi)
+
+def save_figure(fig, output_format, dpi):
+    """Codifica una figura ya construida en un formato y dpi"""
+    from PIL import Image
+    
+    buf = io.BytesIO()
+    if output_format == 'png' and PNG_QUANTIZE:
+        # PNG rápido como intermedio y luego cuantizado a paleta
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight', pil_kwargs={"compress_level": 1})
+        buf.seek(0)
+        image = Image.open(buf).convert('RGB').quantize(256, method=Image.Quantize.FASTOCTREE)
+        buf = io.BytesIO()
+        image.save(buf, format='PNG', compress_level=9)
+    elif output_format == 'webp':
+        fig.savefig(buf, format='webp', dpi=dpi, bbox_inches='tight',
+                    pil_kwargs={"quality": WEBP_QUALITY, "method": 4})
+    elif output_format == 'svg':
+        fig.savefig(buf, format='svg', bbox_inches='tight', metadata={"Date": None})
+    else:
+        fig.savefig(buf, format=output_format, dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
+def render_plot(plot_type, data, start_date=None, end_date=None, variants=(DEFAULT_VARIANT,)):
+    """
+    Renderiza un gráfico en una o más variantes (formato, dpi) construyendo la
+    figura una sola vez. Retorna {variante: bytes} o None si no hay gráfico.
+    Las peticiones concurrentes del mismo gráfico, rango y variantes comparten un único render.
+    """
+    variants = tuple(dict.fromkeys(variants))
+    
+    def render():
+        with _render_lock:
+            fig = PLOT_FUNCTIONS[plot_type](data)
+            if fig is None:
+                return None
+            try:
+                return {variant: save_figure(fig, *variant) for variant in variants}
+            finally:
+                plt.close(fig)
+    
+    return render_flight.do((plot_type, start_date, end_date, variants), render)
+
+def sse_message(event, data):
+    """Formatea un mensaje Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_sse(response):
+    """
+    Lee un stream SSE y produce (evento, datos). Los comentarios keepalive
+    producen (None, None) para poder reenviarlos al cliente.
+    """
+    event = None
+    data_lines = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line.startswith(':'):
+            yield None, None
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data_lines.append(line[5:].strip())
+        elif line == '' and data_lines:
+            yield event, json.loads("\n".join(data_lines))
+            event = None
+            data_lines = []
+
 @app.route("/", methods=["GET"])
 def home():
     """Página de inicio con documentación del servicio"""
@@ -214,14 +423,19 @@ def home():
         },
         "endpoints": {
             "/health": "Health check del servicio",
-            "/plot": "Generar un gráfico específico (params: type, start_date, end_date, format)",
-            "/plot/all": "Generar todos los gráficos en base64 (params: start_date, end_date)"
+            "/plot": "Generar un gráfico específico (params: type, start_date, end_date, format, size, dpi)",
+            "/plot/all": "Generar todos los gráficos (params: start_date, end_date, mode, format, sizes)",
+            "/events": "Stream SSE con la correlación y los gráficos cuando cambian (params: start_date, end_date, types)"
         },
         "examples": [
             "GET /plot?type=correlation&start_date=2024-10-01&end_date=2024-12-31",
             "GET /plot?type=scatter&format=base64",
-            "GET /plot/all?start_date=2024-10-01&end_date=2024-12-31"
-        ]
+            "GET /plot?type=heatmap&format=webp&size=thumbnail",
+            "GET /plot/all?start_date=2024-10-01&end_date=2024-12-31",
+            "GET /plot/all?mode=urls&sizes=thumbnail,full"
+        ],
+        "formats": list(IMAGE_FORMATS),
+        "sizes": IMAGE_SIZES
     }), 200
 
 @app.route("/health", methods=["GET"])
@@ -229,7 +443,18 @@ def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "service": "plotter"
+        "service": "plotter",
+        "imports": import_stats,
+        "coalescing": {
+            "aggregator_fetch": data_flight.stats,
+            "render": render_flight.stats
+        },
+        "events": {
+            "streams": event_relay.streams(),
+            "max_streams": SSE_MAX_STREAMS,
+            "ranges": len(event_relay.ranges),
+            **event_relay.stats
+        }
     }), 200
 
 @app.route("/plot", methods=["GET"])
@@ -240,7 +465,9 @@ def plot():
     - start_date: fecha inicial (YYYY-MM-DD)
     - end_date: fecha final (YYYY-MM-DD)
     - type: tipo de gráfico (correlation, scatter, heatmap), default: correlation
-    - format: formato de salida (png, base64), default: png
+    - format: formato de salida (png, webp, svg, base64), default: png
+    - size: tamaño (thumbnail, full), default: full
+    - dpi: resolución explícita (sobreescribe size)
     """
     try:
         start_date = request.args.get('start_date')
@@ -248,8 +475,27 @@ def plot():
         plot_type = request.args.get('type', 'correlation')
         output_format = request.args.get('format', 'png')
         
-        # Obtener datos
-        aggregated_data = fetch_aggregated_data(start_date, end_date)
+        if plot_type not in PLOT_FUNCTIONS:
+            return jsonify({
+                "status": "error",
+                "message": f"Unknown plot type: {plot_type}"
+            }), 400
+        
+        # base64 es PNG dentro de JSON (compatibilidad)
+        try:
+            variant = resolve_variant(
+                'png' if output_format == 'base64' else output_format,
+                request.args.get('size', 'full'),
+                request.args.get('dpi')
+            )
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+        
+        # Obtener datos (compartido con peticiones concurrentes del mismo rango)
+        aggregated_data = fetch_aggregated_data_shared(start_date, end_date)
         
         if not aggregated_data or aggregated_data.get('status') != 'success':
             return jsonify({
@@ -266,27 +512,19 @@ def plot():
             }), 404
         
         # Crear gráfico según el tipo
-        if plot_type == 'correlation':
-            buf = create_correlation_plot(data)
-        elif plot_type == 'scatter':
-            buf = create_scatter_plot(data)
-        elif plot_type == 'heatmap':
-            buf = create_heatmap(data)
-        else:
-            return jsonify({
-                "status": "error",
-                "message": f"Unknown plot type: {plot_type}"
-            }), 400
+        images = render_plot(plot_type, data, start_date, end_date, [variant])
         
-        if not buf:
+        if not images:
             return jsonify({
                 "status": "error",
                 "message": "Failed to generate plot"
             }), 500
         
+        image = images[variant]
+        
         # Retornar según formato
         if output_format == 'base64':
-            img_base64 = base64.b64encode(buf.read()).decode('utf-8')
+            img_base64 = base64.b64encode(image).decode('utf-8')
             return jsonify({
                 "status": "success",
                 "plot_type": plot_type,
@@ -294,7 +532,13 @@ def plot():
                 "format": "base64"
             }), 200
         else:
-            return send_file(buf, mimetype='image/png', as_attachment=False, download_name=f'{plot_type}_plot.png')
+            return send_file(
+                io.BytesIO(image),
+                mimetype=IMAGE_FORMATS[output_format],
+                as_attachment=False,
+                download_name=f'{plot_type}_plot.{output_format}',
+                max_age=PLOT_MAX_AGE
+            )
         
     except Exception as e:
         logger.error(f"Error generating plot: {str(e)}")
@@ -303,18 +547,75 @@ def plot():
             "message": str(e)
         }), 500
 
+def multipart_plots(data, start_date, end_date, output_format, sizes, correlation):
+    """
+    Genera una respuesta multipart/mixed: primero la correlación en JSON y luego
+    una parte binaria por gráfico y tamaño, enviadas a medida que se renderizan.
+    """
+    boundary = f"plot-{os.urandom(8).hex()}"
+    variants = [resolve_variant(output_format, size) for size in sizes]
+    
+    def part(headers, body):
+        head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        return f"--{boundary}\r\n{head}Content-Length: {len(body)}\r\n\r\n".encode() + body + b"\r\n"
+    
+    def stream():
+        yield part(
+            {"Content-Type": "application/json", "Content-Disposition": 'inline; name="correlation_analysis"'},
+            json.dumps(correlation).encode()
+        )
+        for plot_type in PLOT_FUNCTIONS:
+            images = render_plot(plot_type, data, start_date, end_date, variants)
+            if not images:
+                continue
+            for size, variant in zip(sizes, variants):
+                yield part({
+                    "Content-Type": IMAGE_FORMATS[output_format],
+                    "Content-Disposition": f'inline; name="{plot_type}"; filename="{plot_type}_{size}.{output_format}"',
+                    "X-Plot-Type": plot_type,
+                    "X-Plot-Size": size
+                }, images[variant])
+        yield f"--{boundary}--\r\n".encode()
+    
+    return Response(stream_with_context(stream()), mimetype=f"multipart/mixed; boundary={boundary}")
+
 @app.route("/plot/all", methods=["GET"])
 def plot_all():
     """
-    Genera todos los tipos de gráficos y los retorna en base64.
-    Query params: start_date, end_date
+    Genera todos los tipos de gráficos.
+    Query params:
+    - start_date, end_date: rango de fechas
+    - mode: base64 (JSON, default), multipart (multipart/mixed) o urls (URLs de /plot para pedir en paralelo)
+    - format: png, webp o svg, default: png
+    - sizes: tamaños separados por comas (thumbnail, full), default: full; base64 admite uno solo
     """
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        mode = request.args.get('mode', 'base64')
+        output_format = request.args.get('format', 'png')
+        sizes = [s.strip() for s in request.args.get('sizes', 'full').split(',') if s.strip()]
         
-        # Obtener datos
-        aggregated_data = fetch_aggregated_data(start_date, end_date)
+        if mode not in ('base64', 'multipart', 'urls'):
+            return jsonify({
+                "status": "error",
+                "message": f"Unknown mode: {mode}"
+            }), 400
+        if mode == 'base64' and len(sizes) != 1:
+            return jsonify({
+                "status": "error",
+                "message": "base64 mode supports a single size, use mode=multipart or mode=urls"
+            }), 400
+        try:
+            variants = [resolve_variant(output_format, size) for size in sizes]
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+        
+        # Obtener datos (compartido con peticiones concurrentes del mismo rango)
+        aggregated_data = fetch_aggregated_data_shared(start_date, end_date)
         
         if not aggregated_data or aggregated_data.get('status') != 'success':
             return jsonify({
@@ -330,24 +631,38 @@ def plot_all():
                 "message": "No data available for plotting"
             }), 404
         
-        # Generar todos los gráficos
-        plots = {}
+        if mode == 'urls':
+            # El cliente descarga las imágenes en paralelo (cacheables) desde /plot
+            params = {k: v for k, v in (('start_date', start_date), ('end_date', end_date)) if v}
+            plots = {
+                plot_type: {
+                    size: url_for('plot', type=plot_type, format=output_format, size=size, **params)
+                    for size in sizes
+                }
+                for plot_type in PLOT_FUNCTIONS
+            }
+            return jsonify({
+                "status": "success",
+                "plots": plots,
+                "correlation_analysis": aggregated_data.get('correlation')
+            }), 200
         
-        correlation_buf = create_correlation_plot(data)
-        if correlation_buf:
-            plots['correlation'] = base64.b64encode(correlation_buf.read()).decode('utf-8')
+        if mode == 'multipart':
+            return multipart_plots(data, start_date, end_date, output_format, sizes,
+                                   aggregated_data.get('correlation'))
         
-        scatter_buf = create_scatter_plot(data)
-        if scatter_buf:
-            plots['scatter'] = base64.b64encode(scatter_buf.read()).decode('utf-8')
+        # Generar todos los gráficos
+        plots = {}
         
-        heatmap_buf = create_heatmap(data)
-        if heatmap_buf:
-            plots['heatmap'] = base64.b64encode(heatmap_buf.read()).decode('utf-8')
+        for plot_type in PLOT_FUNCTIONS:
+            images = render_plot(plot_type, data, start_date, end_date, variants)
+            if images:
+                plots[plot_type] = base64.b64encode(images[variants[0]]).decode('utf-8')
         
         return jsonify({
             "status": "success",
             "plots": plots,
+            "format": output_format,
             "correlation_analysis": aggregated_data.get('correlation')
         }), 200
         
@@ -358,6 +673,166 @@ def plot_all():
             "message": str(e)
         }), 500
 
+class EventRelay:
+    """
+    Una sola conexión al /events del aggregator por rango y proceso, compartida
+    por todos los dashboards del rango. Ante cada cambio de correlación obtiene
+    los datos y renderiza los gráficos una vez y reparte los mensajes SSE ya
+    armados a las colas de los clientes. El hilo termina cuando no quedan clientes.
+    """
+    def __init__(self):
+        self.ranges = {}
+        self.latest = {}
+        self._lock = threading.Lock()
+        self.stats = {"rejected": 0, "updates": 0}
+    
+    def streams(self):
+        return sum(len(clients) for clients in self.ranges.values())
+    
+    def subscribe(self, start_date, end_date):
+        """Registra un cliente; None si el proceso ya tiene SSE_MAX_STREAMS streams"""
+        key = (start_date, end_date)
+        client_queue = queue.Queue(maxsize=10)
+        with self._lock:
+            if self.streams() >= SSE_MAX_STREAMS:
+                self.stats["rejected"] += 1
+                return None
+            clients = self.ranges.get(key)
+            if clients is None:
+                clients = self.ranges[key] = set()
+                threading.Thread(target=self._run, args=(key,), name="sse-relay", daemon=True).start()
+            clients.add(client_queue)
+            # Un cliente que llega a un rango ya activo recibe el último estado
+            if key in self.latest:
+                client_queue.put_nowait(self.latest[key])
+        return client_queue
+    
+    def unsubscribe(self, start_date, end_date, client_queue):
+        with self._lock:
+            self.ranges.get((start_date, end_date), set()).discard(client_queue)
+    
+    def _stop_if_idle(self, key):
+        """Decide bajo el lock si el hilo del rango termina (así subscribe no pierde clientes)"""
+        with self._lock:
+            if self.ranges.get(key):
+                return False
+            self.ranges.pop(key, None)
+            self.latest.pop(key, None)
+            return True
+    
+    def _broadcast(self, key, messages):
+        with self._lock:
+            clients = list(self.ranges.get(key, ()))
+        for client_queue in clients:
+            try:
+                client_queue.put_nowait(messages)
+            except queue.Full:
+                pass  # Cliente lento: recibirá el estado actualizado con el próximo cambio
+    
+    def _render_messages(self, key, payload, fresh):
+        """
+        Mensajes de un cambio: (tipo de gráfico o None, texto SSE). Se renderizan
+        todos los tipos para que un cliente que llega después reciba los suyos.
+        """
+        start_date, end_date = key
+        messages = [(None, sse_message('correlation', payload))]
+        
+        aggregated_data = fetch_aggregated_data_shared(start_date, end_date, fresh=fresh)
+        data = aggregated_data.get('data', []) if aggregated_data else []
+        if data:
+            for plot_type in PLOT_FUNCTIONS:
+                images = render_plot(plot_type, data, start_date, end_date)
+                if images:
+                    messages.append((plot_type, sse_message('plot', {
+                        "plot_type": plot_type,
+                        "image": base64.b64encode(images[DEFAULT_VARIANT]).decode('utf-8'),
+                        "format": "base64"
+                    })))
+        return messages
+    
+    def _run(self, key):
+        start_date, end_date = key
+        params = {k: v for k, v in (('start_date', start_date), ('end_date', end_date)) if v}
+        first = True
+        while not self._stop_if_idle(key):
+            try:
+                # El read timeout detecta un aggregator caído (envía keepalives cada SSE_HEARTBEAT s)
+                with requests.get(AGGREGATOR_EVENTS_URL, params=params, stream=True,
+                                  timeout=(5, SSE_HEARTBEAT * 3)) as upstream:
+                    upstream.raise_for_status()
+                    for event, payload in iter_sse(upstream):
+                        if self._stop_if_idle(key):
+                            return
+                        if event is None:
+                            self._broadcast(key, [(None, ": keepalive\n\n")])
+                        elif event == 'correlation':
+                            messages = self._render_messages(key, payload, fresh=not first)
+                            first = False
+                            with self._lock:
+                                self.latest[key] = messages
+                            self.stats["updates"] += 1
+                            self._broadcast(key, messages)
+            except Exception as e:
+                logger.error(f"Error in event relay {key}: {str(e)}")
+                self._broadcast(key, [(None, sse_message('error', {"message": str(e)}))])
+                time.sleep(SSE_RETRY_SECONDS)
+
+event_relay = EventRelay()
+
+@app.route("/events", methods=["GET"])
+def events():
+    """
+    Stream SSE para dashboards: reenvía los cambios de correlación que emite
+    el aggregator y, solo cuando hay cambios, los gráficos re-renderizados.
+    Los dashboards del mismo rango comparten la conexión y los renders (ver EventRelay).
+    Query params:
+    - start_date, end_date: rango de fechas
+    - types: gráficos a enviar, separados por comas, default: todos
+    """
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    types_param = request.args.get('types')
+    plot_types = [t.strip() for t in types_param.split(',')] if types_param else list(PLOT_FUNCTIONS)
+    unknown = [t for t in plot_types if t not in PLOT_FUNCTIONS]
+    if unknown:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown plot type: {', '.join(unknown)}"
+        }), 400
+    
+    client_queue = event_relay.subscribe(start_date, end_date)
+    if client_queue is None:
+        response = jsonify({
+            "status": "error",
+            "message": f"Too many event streams (max {SSE_MAX_STREAMS} per process)"
+        })
+        response.headers["Retry-After"] = str(SSE_HEARTBEAT)
+        return response, 503
+    
+    def stream():
+        while True:
+            try:
+                messages = client_queue.get(timeout=SSE_HEARTBEAT * 2)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            for plot_type, text in messages:
+                if plot_type is None or plot_type in plot_types:
+                    yield text
+    
+    response = Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Se llama aunque el generador nunca llegue a ejecutarse
+    response.call_on_close(lambda: event_relay.unsubscribe(start_date, end_date, client_queue))
+    return response
+
+import_stats["module_import_seconds"] = round(time.time() - _module_start, 3)
+
+# Servidor de desarrollo; en producción se usa gunicorn (ver gunicorn.conf.py)
 if __name__ == "__main__":
     logger.info("Starting Plotter Service")
+    start_warmup()
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Comprobación de redis_nodes contra servidores Redis en memoria (fakeredis).
+
+    pip install fakeredis
+    python shared/check_redis_nodes.py
+
+Verifica que al pasar de 3 a 4 nodos solo se mueven ~1/4 de las claves y
+todas al nodo nuevo, que con un nodo caído solo fallan sus claves, que el
+nodo principal se reutiliza si está en REDIS_NODES y que un error de comando
+o el pool agotado no marcan el nodo como caído.
+"""
+import fakeredis
+import redis
+
+from redis_nodes import HashRing, RedisNode, ShardedCache, build_cache_nodes
+
+KEYS = [f"news:{year}:{month:02d}" for year in range(2000, 2031) for month in range(1, 13)]
+
+class DownClient:
+    """Cliente que falla en cualquier comando, como un nodo caído"""
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("node down")
+        return fail
+
+def make_node(host, port):
+    """Nodo con un servidor fakeredis propio en lugar de una conexión real"""
+    node = RedisNode(host, port)
+    node.client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    return node
+
+def check_rebalance():
+    before = HashRing(["redis-0:6379", "redis-1:6379", "redis-2:6379"])
+    after = HashRing(["redis-0:6379", "redis-1:6379", "redis-2:6379", "redis-3:6379"])
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+    ratio = len(moved) / len(KEYS)
+    print(f"3 -> 4 nodes: {len(moved)}/{len(KEYS)} keys moved ({ratio:.0%})")
+    assert 0.15 < ratio < 0.35, ratio
+    assert all(after.node_for(key) == "redis-3:6379" for key in moved)
+    shares = after.shares()
+    print(f"ring shares: {shares}")
+    assert abs(sum(shares.values()) - 1) < 0.001
+
+def check_node_down():
+    primary = make_node("redis-0", 6379)
+    nodes = build_cache_nodes(primary, ["redis-0:6379", "redis-1:6379", "redis-2"], make_node)
+    assert nodes[0] is primary
+    assert [node.name for node in nodes] == ["redis-0:6379", "redis-1:6379", "redis-2:6379"]
+    cache = ShardedCache(nodes)
+
+    for key in KEYS:
+        assert cache.set(key, key, ex=60)
+    assert cache.mget(KEYS) == [key.encode() for key in KEYS]
+
+    down = cache.nodes["redis-1:6379"]
+    down.client = DownClient()
+    down.state["available"] = False
+    owned = {key for key in KEYS if cache.ring.node_for(key) == down.name}
+    values = cache.mget(KEYS)
+    missing = {key for key, value in zip(KEYS, values) if value is None}
+    print(f"one node down: {len(missing)} misses, {len(owned)} keys on that node")
+    assert missing == owned
+    assert cache.get(next(iter(owned))) is None
+    assert not cache.set(next(iter(owned)), "x")
+    assert down.state["failures"] >= 1 and down.state["last_error"]
+
+def check_command_errors():
+    node = make_node("redis-0", 6379)
+    cache = ShardedCache([node])
+    assert cache.set("news:2023:01", "x")
+    # Un comando no soportado o el pool agotado no son un nodo caído
+    for error in (redis.ResponseError("unknown command 'memory'"), redis.ConnectionError("No connection available.")):
+        node.record_error(error)
+        assert node.state["available"], error
+    assert cache.get("news:2023:01") == b"x"
+    print(f"command errors keep the node in use ({node.state['command_errors']} recorded)")
+    node.record_error(redis.TimeoutError("Timeout reading from socket"))
+    assert not node.state["available"]
+
+if __name__ == "__main__":
+    check_rebalance()
+    check_node_down()
+    check_command_errors()
+    print("ok")
@@ -0,0 +1,216 @@
+"""
+Nodos Redis con reconexión y caché repartida con hashing consistente.
+
+Módulo compartido por commoncrawl-worker (news:{año}:{mes}) y aggregator
+(agg:month:{año}:{mes}). Los Dockerfiles de esos servicios lo copian junto a
+app.py; al ejecutar desde el repo, app.py agrega shared/ al path.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import time
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Nodos virtuales por nodo en el anillo (más nodos virtuales, reparto más parejo)
+DEFAULT_VNODES = 160
+
+def is_node_failure(error):
+    """
+    True si el error indica que el nodo no responde. Un error del comando
+    (ResponseError, comando no soportado) o el pool sin conexiones libres
+    ("No connection available", el nodo está bien pero ocupado) no lo son.
+    """
+    if not isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+        return False
+    return not str(error).startswith("No connection available")
+
+class RedisNode:
+    """
+    Un nodo Redis con su propio pool. Si el nodo cae, get() devuelve None y
+    reintenta la conexión con backoff exponencial en vez de quedarse en modo
+    standalone para siempre.
+    """
+    def __init__(self, host, port, reconnect_base=1.0, reconnect_max=30.0, **pool_options):
+        self.name = f"{host}:{port}"
+        self.reconnect_base = reconnect_base
+        self.reconnect_max = reconnect_max
+        # El pool no abre conexiones hasta el primer uso, así es seguro con el fork de gunicorn
+        self.pool = redis.BlockingConnectionPool(host=host, port=port, **pool_options)
+        self.client = redis.Redis(connection_pool=self.pool)
+        self.state = {
+            "available": False,
+            "failures": 0,
+            "next_retry": 0.0,
+            "last_error": None,
+            "command_errors": 0
+        }
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Devuelve el cliente si el nodo está disponible, o None"""
+        if self.state["available"]:
+            return self.client
+        if time.time() < self.state["next_retry"]:
+            return None
+
+        with self._lock:
+            if self.state["available"]:
+                return self.client
+            if time.time() < self.state["next_retry"]:
+                return None
+            try:
+                self.client.ping()
+            except redis.RedisError as e:
+                if is_node_failure(e):
+                    self.mark_failure(e)
+                return None
+
+            if self.state["failures"]:
+                logger.info(f"Reconnected to Redis {self.name} after {self.state['failures']} failed attempts")
+            else:
+                logger.info(f"Connected to Redis {self.name} successfully")
+            self.state.update(available=True, failures=0, next_retry=0.0, last_error=None)
+            return self.client
+
+    def mark_failure(self, error):
+        """Marca el nodo como no disponible y programa el próximo intento de reconexión"""
+        self.state["failures"] += 1
+        delay = min(self.reconnect_max, self.reconnect_base * 2 ** (self.state["failures"] - 1))
+        self.state.update(available=False, next_retry=time.time() + delay, last_error=str(error))
+        logger.warning(f"Redis {self.name} not available ({error}), retrying in {delay:.0f}s")
+
+    def record_error(self, error):
+        """
+        Registra un error de un comando. Solo los errores de conexión marcan el
+        nodo como no disponible (ver is_node_failure); el resto se cuenta y el
+        nodo sigue en uso.
+        """
+        if is_node_failure(error):
+            self.mark_failure(error)
+            return
+        self.state["command_errors"] += 1
+        self.state["last_error"] = str(error)
+        logger.warning(f"Redis {self.name} command failed ({error})")
+
+def ring_hash(value):
+    """Posición en el anillo: 64 bits de MD5 (estable entre procesos, a diferencia de hash())"""
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+class HashRing:
+    """
+    Anillo de hashing consistente con nodos virtuales. Al agregar un nodo solo
+    cambian de dueño ~1/N de las claves (las que caen en sus nodos virtuales).
+    """
+    def __init__(self, names, vnodes=DEFAULT_VNODES):
+        points = sorted(
+            (ring_hash(f"{name}#{i}"), name)
+            for name in names
+            for i in range(vnodes)
+        )
+        self.names = list(names)
+        self._hashes = [h for h, _ in points]
+        self._owners = [name for _, name in points]
+
+    def node_for(self, key):
+        """Nodo dueño de una clave: el primer nodo virtual en sentido horario"""
+        index = bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+    def shares(self):
+        """Fracción del espacio de claves que le toca a cada nodo"""
+        shares = dict.fromkeys(self.names, 0)
+        previous = self._hashes[-1] - 2 ** 64
+        for h, name in zip(self._hashes, self._owners):
+            shares[name] += h - previous
+            previous = h
+        return {name: round(share / 2 ** 64, 4) for name, share in shares.items()}
+
+class ShardedCache:
+    """
+    Caché repartida entre varios nodos Redis. Un nodo caído solo afecta a sus
+    claves: las lecturas son fallos de caché y las escrituras se saltan. Un
+    error del comando solo afecta a esa operación.
+    """
+    def __init__(self, nodes, vnodes=DEFAULT_VNODES):
+        self.nodes = {node.name: node for node in nodes}
+        self.ring = HashRing(list(self.nodes), vnodes)
+
+    def node_for(self, key):
+        return self.nodes[self.ring.node_for(key)]
+
+    def available(self, key):
+        return self.node_for(key).get() is not None
+
+    def get(self, key):
+        node = self.node_for(key)
+        client = node.get()
+        if not client:
+            return None
+        try:
+            return client.get(key)
+        except redis.RedisError as e:
+            node.record_error(e)
+            return None
+
+    def set(self, key, value, ex=None):
+        """Escribe en el nodo dueño; False si no está disponible"""
+        node = self.node_for(key)
+        client = node.get()
+        if not client:
+            return False
+        try:
+            client.set(key, value, ex=ex)
+            return True
+        except redis.RedisError as e:
+            node.record_error(e)
+            return False
+
+    def exists(self, key):
+        node = self.node_for(key)
+        client = node.get()
+        if not client:
+            return False
+        try:
+            return bool(client.exists(key))
+        except redis.RedisError as e:
+            node.record_error(e)
+            return False
+
+    def mget(self, keys):
+        """MGET repartido: un round-trip por nodo, valores en el orden de keys"""
+        by_node = {}
+        for index, key in enumerate(keys):
+            by_node.setdefault(self.ring.node_for(key), []).append(index)
+
+        values = [None] * len(keys)
+        for name, indexes in by_node.items():
+            node = self.nodes[name]
+            client = node.get()
+            if not client:
+                continue
+            try:
+                for index, value in zip(indexes, client.mget([keys[i] for i in indexes])):
+                    values[index] = value
+            except redis.RedisError as e:
+                node.record_error(e)
+        return values
+
+def parse_node(address, default_port=6379):
+    """"host:puerto" -> (host, puerto)"""
+    host, _, port = address.rpartition(":")
+    return (host, int(port)) if host else (address, default_port)
+
+def build_cache_nodes(primary, addresses, make_node):
+    """
+    Nodos de la caché a partir de una lista "host:puerto". Sin direcciones la
+    caché es solo el nodo principal; si el principal está en la lista se reutiliza.
+    """
+    nodes = []
+    for address in addresses or [primary.name]:
+        host, port = parse_node(address)
+        nodes.append(primary if f"{host}:{port}" == primary.name else make_node(host, port))
+    return nodes